@@ -0,0 +1,75 @@
+"""
+Dashboard search and replace throughput on the sample dashboards in test.zip.
+
+Builds a builder config from the application names found in each dashboard (plus a key scoped
+number and regex rule) with --rows replace rows, and times Dashboards._repeat_dashboard on it.
+
+    python benchmarks/bench_dashboards.py --rows 300 --runs 3
+"""
+import argparse
+import configparser
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+import zipfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from AppDApiTools.api_classes.dashboards import Dashboards  # noqa: E402
+
+SAMPLE_ZIP = os.path.join(BENCH_DIR, '..', 'test.zip')
+
+
+def load_dashboards(path):
+    with zipfile.ZipFile(path) as archive:
+        return {name: json.loads(archive.read(name)) for name in archive.namelist() if name.endswith('.json')}
+
+
+def application_names(dashboard):
+    names = set()
+    for widget in dashboard['widgetTemplates']:
+        for series in widget.get('dataSeriesTemplates') or []:
+            criteria = (series.get('metricMatchCriteriaTemplate') or {}).get('entityMatchCriteria') or {}
+            for entity in criteria.get('entityNames') or []:
+                names.add(entity['applicationName'])
+    return sorted(names)
+
+
+def builder_config(dashboard, rows, searches):
+    search = application_names(dashboard)[:searches]
+    search += [{"value": r"^Metric(\w+)Widget$", "regex": True, "key": "widgetType"}, {"value": 34, "key": "height"}]
+    replace = []
+    for row in range(rows):
+        replace.append([f'{name} {row}' for name in search[:-2]] + [rf'Metric\1Widget', 34 + row % 3])
+    return {"search": search, "replace": replace, "options": {"extendWidgets": False}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dashboard search and replace.')
+    parser.add_argument('--input', default=SAMPLE_ZIP, help='Zip of dashboard exports (test.zip)')
+    parser.add_argument('--rows', type=int, default=200, help='Replace rows in the builder config')
+    parser.add_argument('--searches', type=int, default=5, help='Application name searches per row')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    dash = Dashboards(configparser.ConfigParser(), argparse.Namespace(verbose=False))
+    for name, dashboard in load_dashboards(args.input).items():
+        dash.builder_config = builder_config(dashboard, args.rows, args.searches)
+        timings = []
+        for _ in range(args.runs):
+            source = copy.deepcopy(dashboard)
+            start = time.perf_counter()
+            result = dash._repeat_dashboard(source)
+            timings.append(time.perf_counter() - start)
+        widgets = len(result['widgetTemplates'])
+        median = statistics.median(timings)
+        print(f'{name}: {len(json.dumps(dashboard)) / 1024:.0f} KB, {len(dash.builder_config["search"])} searches x '
+              f'{args.rows} rows -> {widgets} widgets, median {median * 1000:.1f} ms ({widgets / median:.0f} widgets/s)')
+
+
+if __name__ == '__main__':
+    main()
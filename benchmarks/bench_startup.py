@@ -0,0 +1,75 @@
+"""
+Startup cost of the appd_api_tools entry point.
+
+Times `appd_api_tools -h` and a single command's -h in fresh interpreters and reports the
+heaviest imports from python -X importtime, so regressions in the lazy command registry show up.
+
+    python benchmarks/bench_startup.py --runs 10 --max_ms 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC_DIR, env.get('PYTHONPATH')]))
+    return env
+
+
+def time_command(argv, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'AppDApiTools.appd_tools'] + argv, env=_env(),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def import_costs(argv):
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr
+    code = f'import sys; sys.argv = {["appd_api_tools"] + argv!r}\n' \
+           'from AppDApiTools import appd_tools\n' \
+           'try:\n    appd_tools.do_work()\nexcept SystemExit:\n    pass'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False)
+    costs = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        costs.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark appd_api_tools startup time.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Number of heaviest imports to list')
+    parser.add_argument('--max_ms', type=float, help='Fail when the median top level -h exceeds this')
+    args = parser.parse_args()
+
+    scenarios = [('appd_api_tools -h', ['-h']), ('appd_api_tools Healthrules -h', ['Healthrules', '-h'])]
+    top_level_ms = None
+    for label, argv in scenarios:
+        median_ms = time_command(argv, args.runs)
+        top_level_ms = median_ms if top_level_ms is None else top_level_ms
+        costs = import_costs(argv)
+        total_ms = sum(c[1] for c in costs) / 1000
+        print(f'{label}: median {median_ms:.1f} ms over {args.runs} runs, {len(costs)} modules imported '
+              f'({total_ms:.1f} ms import time)')
+        for cumulative_us, self_us, name in sorted(costs, reverse=True)[:args.top]:
+            print(f'    {cumulative_us / 1000:8.1f} ms  {name.strip()}')
+    if args.max_ms is not None and top_level_ms > args.max_ms:
+        print(f'appd_api_tools -h took {top_level_ms:.1f} ms, over the {args.max_ms} ms budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
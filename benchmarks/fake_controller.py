@@ -0,0 +1,458 @@
+"""
+Local stand-in AppDynamics controller for benchmarks and manual testing.
+
+Serves synthetic data for the endpoints the api_classes call, keeps created/deleted
+objects in memory and counts requests so benchmark runs can report throughput.
+
+    python benchmarks/fake_controller.py --port 8090 --apps 1000 --rules 20 --latency 20
+"""
+import argparse
+import copy
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+AFFECTED_TYPES = ['BUSINESS_TRANSACTION_PERFORMANCE', 'TIER_NODE_TRANSACTION_PERFORMANCE',
+                  'TIER_NODE_HARDWARE', 'OVERALL_APPLICATION_PERFORMANCE']
+
+
+class FakeControllerData:
+
+    def __init__(self, apps=100, rules=10, suppressions=3, users=50, roles=10, dashboards=20, synthetics=20):
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.next_id = 100000
+        self.applications = [{'id': i, 'name': f'App-{i:05d}', 'description': '', 'accountGuid': 'fake'}
+                             for i in range(1, apps + 1)]
+        self.health_rules = {}
+        self.suppressions = {}
+        for app in self.applications:
+            self.health_rules[app['id']] = {r['id']: r for r in
+                                            (self._make_rule(app['id'], n) for n in range(rules))}
+            self.suppressions[app['id']] = {s['id']: s for s in
+                                            (self._make_suppression(app['id'], n) for n in range(suppressions))}
+        self.roles = {i: {'id': i, 'name': f'Role-{i}', 'description': '', 'permissions': []}
+                      for i in range(1, roles + 1)}
+        self.users = {i: {'id': i, 'name': f'user{i}', 'displayName': f'User {i}', 'email': f'user{i}@example.com',
+                          'roles': [{'id': (i % roles) + 1, 'name': f'Role-{(i % roles) + 1}'}] if roles else []}
+                      for i in range(1, users + 1)}
+        template = self._load_dashboard_template()
+        self.dashboards = {}
+        for i in range(1, dashboards + 1):
+            dash = copy.deepcopy(template)
+            dash['name'] = f'Dashboard {i}'
+            dash['id'] = i
+            self.dashboards[i] = {'data': dash, 'modifiedOn': 1600000000000 + i}
+        self.synthetics = {kind: [{'_id': f'{kind}-{i}', 'description': f'Job {i}', 'appKey': f'AD-{i % 5}',
+                                   'userEnabled': True} for i in range(synthetics)] for kind in ('web', 'api')}
+        self.schemas = {}
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def _make_rule(self, app_id, n):
+        rule_id = app_id * 1000 + n
+        return {
+            'id': rule_id,
+            'name': 'Business Transaction response time is much higher than normal' if n == 0 else f'Rule {n}',
+            'enabled': n % 4 != 3,
+            'useDataFromLastNMinutes': 30,
+            'waitTimeAfterViolation': 30 if app_id % 7 else 15,
+            'scheduleName': 'Always',
+            'affects': {'affectedEntityType': AFFECTED_TYPES[n % len(AFFECTED_TYPES)],
+                        'affectedBusinessTransactions': {'businessTransactionScope': 'ALL_BUSINESS_TRANSACTIONS'}},
+            'evalCriterias': {'criticalCriteria': {'conditionAggregationType': 'ALL', 'conditions': [
+                {'name': 'Condition 1', 'shortName': 'A', 'evaluateToTrueOnNoData': False,
+                 'evalDetail': {'evalDetailType': 'SINGLE_METRIC', 'metricAggregateFunction': 'VALUE',
+                                'metricPath': 'Average Response Time (ms)',
+                                'metricEvalDetail': {'metricEvalDetailType': 'BASELINE_TYPE',
+                                                     'baselineCondition': 'WITHIN_BASELINE',
+                                                     'baselineName': 'All data - Last 15 days',
+                                                     'baselineUnit': 'STANDARD_DEVIATIONS',
+                                                     'compareValue': 3}}}]},
+                              'warningCriteria': None},
+        }
+
+    def _make_suppression(self, app_id, n):
+        sup_id = app_id * 1000 + n
+        return {'id': sup_id, 'name': f'Maintenance {n}', 'disableAgentReporting': False,
+                'suppressionScheduleType': 'ONE_TIME', 'timezone': 'UTC',
+                'startTime': '2020-01-01T00:00:00', 'endTime': '2020-01-01T01:00:00' if n else '2099-01-01T01:00:00',
+                'recurringSchedule': None, 'affects': {'affectedInfoType': 'APPLICATION'},
+                'healthRuleScope': {'healthRuleScopeType': 'ALL_HEALTH_RULES'}}
+
+    @staticmethod
+    def _load_dashboard_template():
+        test_zip = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test.zip')
+        if os.path.exists(test_zip):
+            with zipfile.ZipFile(test_zip) as archive:
+                return json.loads(archive.read(archive.namelist()[0]))
+        return {'name': 'Template', 'height': 768, 'width': 1024, 'canvasType': 'CANVAS_TYPE_ABSOLUTE',
+                'widgetTemplates': [{'widgetType': 'TextWidget', 'x': 0, 'y': 0, 'height': 50, 'width': 100,
+                                     'text': 'App-00001'}]}
+
+    def app_by_ref(self, ref):
+        for app in self.applications:
+            if str(app['id']) == ref or app['name'] == ref:
+                return app
+        return None
+
+
+class FakeControllerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    data = None
+    latency = 0.0
+    throttle_every = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        payload = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _json_body(self):
+        raw = self._body()
+        return json.loads(raw) if raw else None
+
+    def _handle(self, method):
+        data = self.data
+        parsed = urlparse(self.path)
+        path = parsed.path.strip('/')
+        query = parse_qs(parsed.query)
+        if path == '_fake/stats':
+            # bookkeeping calls are not counted, delayed or throttled
+            return self.stats_get(query)
+        with data.lock:
+            data.request_count += 1
+            count = data.request_count
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle_every and count % self.throttle_every == 0:
+            self._body()
+            return self._send(429, {'message': 'throttled'}, {'Retry-After': '0'})
+        for pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and hasattr(self, f'{handler}_{method}'):
+                return getattr(self, f'{handler}_{method}')(query, *match.groups())
+        self._body()
+        self._send(404, {'message': f'no route for {method} {path}'})
+
+    def do_GET(self):
+        self._handle('get')
+
+    def do_POST(self):
+        self._handle('post')
+
+    def do_PUT(self):
+        self._handle('put')
+
+    def do_PATCH(self):
+        self._handle('patch')
+
+    def do_DELETE(self):
+        self._handle('delete')
+
+    # oauth
+    def token_post(self, query):
+        self._body()
+        self._send(200, {'access_token': 'fake-token', 'expires_in': 300})
+
+    # applications
+    def applications_get(self, query):
+        self._send(200, self.data.applications)
+
+    def app_events_get(self, query, app_ref):
+        self._send(200, [{'id': 1, 'type': 'APPLICATION_DEPLOYMENT', 'summary': f'deploy {app_ref}'}])
+
+    def app_metrics_get(self, query, app_ref):
+        self._send(200, [{'name': 'Overall Application Performance', 'type': 'folder'},
+                         {'name': 'Business Transaction Performance', 'type': 'folder'},
+                         {'name': 'Application Infrastructure Performance', 'type': 'folder'}])
+
+    def app_metric_data_get(self, query, app_ref):
+        path = query.get('metric-path', [''])[0]
+        self._send(200, [{'metricName': path, 'metricPath': path, 'frequency': 'ONE_MIN',
+                          'metricValues': [{'value': 42, 'count': 1, 'sum': 42}]}])
+
+    def app_backends_get(self, query, app_ref):
+        self._send(200, [{'id': 1, 'name': 'db', 'exitPointType': 'HTTP',
+                          'properties': [{'name': 'URL', 'value': f'https://{app_ref}.example.com'}]}])
+
+    # health rules
+    def _app(self, app_id):
+        app = self.data.app_by_ref(app_id)
+        if app is None:
+            self._body()
+            self._send(404, {'message': 'no such application'})
+        return app
+
+    def health_rules_get(self, query, app_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        self._send(200, [{'id': r['id'], 'name': r['name'], 'enabled': r['enabled'],
+                          'affectedEntityType': r['affects']['affectedEntityType']}
+                         for r in self.data.health_rules[app['id']].values()])
+
+    def health_rules_post(self, query, app_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        rule = self._json_body()
+        if any(r['name'] == rule['name'] for r in self.data.health_rules[app['id']].values()):
+            return self._send(409, {'message': 'Health rule with same name already exists'})
+        rule['id'] = self.data.new_id()
+        self.data.health_rules[app['id']][rule['id']] = rule
+        self._send(201, rule)
+
+    def health_rule_get(self, query, app_id, rule_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        rule = self.data.health_rules[app['id']].get(int(rule_id))
+        if rule is None:
+            return self._send(404, {'message': 'no such health rule'})
+        self._send(200, rule)
+
+    def health_rule_put(self, query, app_id, rule_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        rule = self._json_body()
+        rule['id'] = int(rule_id)
+        self.data.health_rules[app['id']][int(rule_id)] = rule
+        self._send(200, rule)
+
+    def health_rule_delete(self, query, app_id, rule_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        if self.data.health_rules[app['id']].pop(int(rule_id), None) is None:
+            return self._send(404, {'message': 'no such health rule'})
+        self._send(204)
+
+    # action suppressions
+    def suppressions_get(self, query, app_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        self._send(200, [{'id': s['id'], 'name': s['name'], 'disableAgentReporting': s['disableAgentReporting']}
+                         for s in self.data.suppressions[app['id']].values()])
+
+    def suppressions_post(self, query, app_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        suppression = self._json_body()
+        suppression['id'] = self.data.new_id()
+        self.data.suppressions[app['id']][suppression['id']] = suppression
+        self._send(201, suppression)
+
+    def suppression_get(self, query, app_id, sup_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        suppression = self.data.suppressions[app['id']].get(int(sup_id))
+        if suppression is None:
+            return self._send(404, {'message': 'no such action suppression'})
+        self._send(200, suppression)
+
+    def suppression_delete(self, query, app_id, sup_id):
+        app = self._app(app_id)
+        if app is None:
+            return
+        if self.data.suppressions[app['id']].pop(int(sup_id), None) is None:
+            return self._send(404, {'message': 'no such action suppression'})
+        self._send(204)
+
+    # rbac
+    def users_get(self, query):
+        self._send(200, {'users': [{'id': u['id'], 'name': u['name']} for u in self.data.users.values()]})
+
+    def user_get(self, query, user_id):
+        user = self.data.users.get(int(user_id))
+        self._send(200 if user else 404, user or {'message': 'no such user'})
+
+    def role_get(self, query, role_id):
+        role = self.data.roles.get(int(role_id))
+        self._send(200 if role else 404, role or {'message': 'no such role'})
+
+    def role_name_get(self, query, role_name):
+        role = next((r for r in self.data.roles.values() if r['name'] == role_name), None)
+        self._send(200 if role else 404, role or {'message': 'no such role'})
+
+    # dashboards
+    def dashboard_servlet_get(self, query):
+        dash = self.data.dashboards.get(int(query.get('dashboardId', ['0'])[0]))
+        if dash is None:
+            return self._send(500, {'message': 'no such dashboard'})
+        self._send(200, dash['data'])
+
+    def dashboard_servlet_post(self, query):
+        raw = self._body()
+        # multipart upload, the json document is the only part that starts with {
+        start = raw.find(b'{')
+        end = raw.rfind(b'}')
+        dash = json.loads(raw[start:end + 1])
+        dash_id = self.data.new_id()
+        dash['id'] = dash_id
+        self.data.dashboards[dash_id] = {'data': dash, 'modifiedOn': int(time.time() * 1000)}
+        self._send(200, {'success': True, 'dashboard': {'id': dash_id, 'name': dash.get('name')}})
+
+    def dashboard_list_get(self, query):
+        self._send(200, [{'id': k, 'name': v['data']['name'], 'modifiedOn': v['modifiedOn']}
+                         for k, v in self.data.dashboards.items()])
+
+    # synthetics
+    def synth_web_get(self, query):
+        self._send(200, {'_items': self.data.synthetics['web']})
+
+    def synth_api_get(self, query):
+        self._send(200, {'_items': self.data.synthetics['api']})
+
+    def synth_web_job_put(self, query, job_id):
+        self._send(200, self._json_body())
+
+    def synth_api_job_put(self, query, job_id):
+        self._send(200, self._json_body())
+
+    # benchmark bookkeeping
+    def stats_get(self, query):
+        self._send(200, {'requests': self.data.request_count})
+
+    # analytics events
+    def schema_get(self, query, name):
+        schema = self.data.schemas.get(name)
+        self._send(200 if schema else 404, schema or {'message': 'no such schema'})
+
+    def schema_post(self, query, name):
+        self.data.schemas[name] = self._json_body()
+        self._send(201)
+
+    def schema_patch(self, query, name):
+        self._json_body()
+        self._send(200)
+
+    def schema_delete(self, query, name):
+        self.data.schemas.pop(name, None)
+        self._send(200)
+
+    def publish_post(self, query, name):
+        self._body()
+        self._send(200)
+
+
+ROUTES = [
+    (r'controller/api/oauth/access_token', 'token'),
+    (r'controller/rest/applications', 'applications'),
+    (r'controller/rest/applications/([^/]+)/events', 'app_events'),
+    (r'controller/rest/applications/([^/]+)/metrics', 'app_metrics'),
+    (r'controller/rest/applications/([^/]+)/metric-data', 'app_metric_data'),
+    (r'controller/rest/applications/([^/]+)/backends', 'app_backends'),
+    (r'controller/alerting/rest/v1/applications/([^/]+)/health-rules', 'health_rules'),
+    (r'controller/alerting/rest/v1/applications/([^/]+)/health-rules/(\d+)', 'health_rule'),
+    (r'controller/alerting/rest/v1/applications/([^/]+)/action-suppressions', 'suppressions'),
+    (r'controller/alerting/rest/v1/applications/([^/]+)/action-suppressions/(\d+)', 'suppression'),
+    (r'controller/api/rbac/v1/users', 'users'),
+    (r'controller/api/rbac/v1/users/(\d+)', 'user'),
+    (r'controller/api/rbac/v1/roles/(\d+)', 'role'),
+    (r'controller/api/rbac/v1/roles/name/(.+)', 'role_name'),
+    (r'controller/CustomDashboardImportExportServlet', 'dashboard_servlet'),
+    (r'controller/restui/dashboards/getAllDashboardsByType/false', 'dashboard_list'),
+    (r'v1/synthetic/schedule', 'synth_web'),
+    (r'v1/synthetic/api/schedule', 'synth_api'),
+    (r'v1/synthetic/schedule/([^/]+)', 'synth_web_job'),
+    (r'v1/synthetic/api/schedule/([^/]+)', 'synth_api_job'),
+    (r'events/schema/([^/]+)', 'schema'),
+    (r'events/publish/([^/]+)', 'publish'),
+    (r'_fake/stats', 'stats'),
+]
+
+
+def start_server(port=0, latency_ms=0, throttle_every=0, **scale):
+    """Start a fake controller in a background thread and return (server, data)."""
+    data = FakeControllerData(**scale)
+    handler = type('BoundFakeControllerHandler', (FakeControllerHandler,),
+                   {'data': data, 'latency': latency_ms / 1000.0, 'throttle_every': throttle_every})
+    ThreadingHTTPServer.request_queue_size = 128
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, data
+
+
+def write_config(path, port, key=None):
+    """Write a config.ini pointing every section at the fake controller."""
+    from cryptography.fernet import Fernet
+    key = key or Fernet.generate_key()
+    base = f'http://127.0.0.1:{port}/'
+    with open(path, 'w') as config_file:
+        config_file.write(f"""[CONTROLLER_INFO]
+client_id = bench
+account_name = fake
+global_account_name = fake
+client_secret = secret
+token_url = {base}controller/api/oauth/access_token
+base_url = {base}
+events_url = {base}
+events_api_key = key
+user = bench
+psw = {Fernet(key).encrypt(b'secret').decode()}
+key = {key.decode()}
+
+[SYNTH_INFO]
+synthetic_base_url = {base}
+eum_account_name = fake
+eum_license_key = fake
+""")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local fake AppDynamics controller.')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--apps', type=int, default=100)
+    parser.add_argument('--rules', type=int, default=10)
+    parser.add_argument('--suppressions', type=int, default=3)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--roles', type=int, default=10)
+    parser.add_argument('--dashboards', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0, help='Per request latency in ms')
+    parser.add_argument('--throttle_every', type=int, default=0, help='Answer every Nth request with 429')
+    parser.add_argument('--write_config', help='Write a config.ini for this server to the given path')
+    args = parser.parse_args()
+    server, data = start_server(args.port, args.latency, args.throttle_every, apps=args.apps, rules=args.rules,
+                                suppressions=args.suppressions, users=args.users, roles=args.roles,
+                                dashboards=args.dashboards)
+    if args.write_config:
+        write_config(args.write_config, server.server_address[1])
+    print(f'Fake controller listening on http://127.0.0.1:{server.server_address[1]}/ (ctrl-c to stop)', flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+End to end throughput benchmarks of the api_classes commands against the local fake controller.
+
+Starts benchmarks/fake_controller.py in its own process (so it doesn't share the GIL with the
+client), points a throwaway config.ini at it and runs real commands the way appd_api_tools does,
+reporting requests/sec and wall time per scenario.
+
+    python benchmarks/run_benchmarks.py --apps 1000 --latency 20 --workers 16
+    python benchmarks/run_benchmarks.py --scenario health_search --scenario health_get
+"""
+import argparse
+import configparser
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_controller import write_config  # noqa: E402
+
+# name: (description, argv), {out} is replaced with a file in the run's temp dir
+SCENARIOS = {
+    'app_list': ('list applications', ['Applications', 'list', '--output', '{out}']),
+    'health_list': ('list health rules across all apps',
+                    ['Healthrules', 'list', '--application', 'all', '--output', '{out}']),
+    'health_search': ('search health rules across all apps',
+                      ['Healthrules', 'search', '--application', 'all', '--name', 'response time',
+                       '--output', '{out}']),
+    'health_get': ('get one health rule by name from all apps',
+                   ['Healthrules', 'get', '--application', 'all', '--name', 'Rule 1', '--output', '{out}']),
+    'suppression_list': ('list action suppressions across all apps',
+                         ['Healthrules', 'suppression_list', '--application', 'all', '--output', '{out}']),
+    'metric_tree': ('metric hierarchy for all apps',
+                    ['Metrics', 'get_tree', '--application', 'all', '--output', '{out}']),
+    'users_all': ('all users with their roles', ['Users', 'all_data', '--output', '{out}']),
+    'dashboard_backup': ('backup 20 dashboards',
+                         ['Dashboards', 'backup', '--id', ','.join(str(i) for i in range(1, 21)),
+                          '--output', '{out}.zip']),
+}
+
+
+def start_fake_controller(args):
+    command = [sys.executable, os.path.join(BENCH_DIR, 'fake_controller.py'), '--port', '0',
+               '--apps', str(args.apps), '--rules', str(args.rules), '--suppressions', str(args.suppressions),
+               '--users', str(args.users), '--dashboards', '20', '--latency', str(args.latency),
+               '--throttle_every', str(args.throttle_every)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    port = int(line.split('http://127.0.0.1:')[1].split('/')[0])
+    return process, port
+
+
+def request_count(port):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/_fake/stats') as response:
+        return json.loads(response.read())['requests']
+
+
+def run_command(argv, config):
+    parser = argparse.ArgumentParser()
+    sub_parser = parser.add_subparsers(dest='subparser_name')
+    from AppDApiTools.appd_tools import get_api_class
+    api_class = get_api_class(argv[0])
+    api_class.get_function_parms(sub_parser)
+    api_class.run(parser.parse_args(argv), config)
+
+
+def reset_process_state():
+    # each scenario starts cold, like a fresh cli run
+    from AppDApiTools.api_classes import api_base, applications
+    api_base.ApiBase._sessions.clear()
+    api_base.ApiBase._tokens.clear()
+    applications.ApplicationDirectory._directories.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark api_classes commands against a fake controller.')
+    parser.add_argument('--apps', type=int, default=200)
+    parser.add_argument('--rules', type=int, default=10)
+    parser.add_argument('--suppressions', type=int, default=3)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=20, help='Fake controller latency per request in ms')
+    parser.add_argument('--throttle_every', type=int, default=0, help='Fake controller answers every Nth call 429')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Scenarios to run (all)')
+    parser.add_argument('--cache', action='store_true', help='Allow the response cache instead of --no_cache')
+    parser.add_argument('--json', help='Also write the results as json to this file')
+    args = parser.parse_args()
+
+    process, port = start_fake_controller(args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            config = configparser.ConfigParser()
+            config.read(write_config(os.path.join(work_dir, 'config.ini'), port))
+            # keep the real token cache untouched by pointing it into the temp dir
+            api_base = importlib.import_module('AppDApiTools.api_classes.api_base')
+            api_base.TOKEN_CACHE_FILE = os.path.join(work_dir, 'token_cache.json')
+            print(f'{"scenario":<18} {"requests":>9} {"wall s":>8} {"req/s":>9}  description')
+            for name in args.scenario or SCENARIOS:
+                description, argv = SCENARIOS[name]
+                argv = [a.replace('{out}', os.path.join(work_dir, name)) for a in argv]
+                if argv[0] in ('Applications', 'Healthrules', 'Metrics'):
+                    argv += ['--workers', str(args.workers)]
+                if not args.cache and argv[0] != 'Dashboards':
+                    argv.append('--no_cache')
+                reset_process_state()
+                before = request_count(port)
+                start = time.perf_counter()
+                run_command(argv, config)
+                wall = time.perf_counter() - start
+                requests_made = request_count(port) - before
+                results.append({'scenario': name, 'requests': requests_made, 'wall_s': wall,
+                                'requests_per_s': requests_made / wall if wall else 0})
+                print(f'{name:<18} {requests_made:>9} {wall:>8.2f} {requests_made / wall:>9.1f}  {description}')
+    finally:
+        process.terminate()
+        process.wait()
+    if args.json:
+        with open(args.json, 'w') as outfile:
+            json.dump({'settings': vars(args), 'results': results}, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
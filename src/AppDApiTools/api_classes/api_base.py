@@ -1,17 +1,46 @@
+import argparse
+import collections
 import datetime
+import itertools
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
 import requests
 import logging
-from cryptography.fernet import Fernet
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .cache_policy import get_endpoint_ttl
+from .profiler import RequestProfiler
+from .throttle import Throttle, THROTTLE_STATUS, is_retryable
+
+TOKEN_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'token_cache.json')
+# seconds before expires_in that a cached token is considered stale
+TOKEN_EXPIRY_MARGIN = 60
+# default --workers for calls fanned out over many applications
+DEFAULT_WORKERS = 4
 
 
 class ApiBase:
     CONTROLLER_SECTION = 'CONTROLLER_INFO'
     SYNTH_SECTION = 'SYNTH_INFO'
     oath_token = None
+    # keep-alive session and throttle shared by every ApiBase instance, keyed by (config section, host)
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+    # oauth tokens shared by every instance in the process, keyed by config section
+    _tokens = {}
+    _token_locks = {}
+    _response_cache = None
+    # items failed in any fan out of the process, do_work exits non-zero when there were some
+    failed_items = 0
 
     def __init__(self, config, args):
         self.oauth_token = None
+        self.fan_out_errors = []
         self.config = config
         self.args = args
 
@@ -39,31 +68,337 @@ class ApiBase:
             requests_log.setLevel(logging.CRITICAL)
             requests_log.propagate = True
 
+    def get_session(self, url, section=None):
+        return self._get_system(url, section)[0]
+
+    def get_throttle(self, url, section=None):
+        return self._get_system(url, section)[1]
+
+    def _get_system(self, url, section=None):
+        if section is None:
+            section = self.CONTROLLER_SECTION
+        session_key = (section, urlparse(url).netloc)
+        with ApiBase._sessions_lock:
+            system = ApiBase._sessions.get(session_key)
+            if system is None:
+                options = self.config[section] if self.config.has_section(section) else {}
+                system = (self._build_session(section, options), self._build_throttle(options))
+                ApiBase._sessions[session_key] = system
+        return system
+
+    def _build_session(self, section, options):
+        # pool settings are optional in config.ini, see config/sample-config.ini
+        # size the pool to the worker count so concurrent calls never open throwaway connections
+        pool_size = int(options.get('pool_size', max(10, self.get_workers())))
+        retries = Retry(total=int(options.get('pool_retries', 3)),
+                        connect=int(options.get('pool_retries', 3)),
+                        read=0,
+                        status=0,
+                        backoff_factor=float(options.get('pool_backoff', 0.5)),
+                        # 429/503 and Retry-After are handled by the throttle in do_request
+                        respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if str(options.get('pool_keep_alive', 'true')).lower() == 'false':
+            session.headers['Connection'] = 'close'
+        self.do_verbose_print(f'Created session pool for [{section}] with size {pool_size}')
+        return session
+
+    def _build_throttle(self, options):
+        return Throttle(rate=float(options.get('rate_limit', 0)),
+                        burst=options.get('rate_burst'),
+                        max_concurrency=int(options.get('max_concurrency', max(10, self.get_workers()))),
+                        retries=int(options.get('throttle_retries', 5)),
+                        backoff=float(options.get('throttle_backoff', 1.0)))
+
+    def get_response_cache(self):
+        # None when the cache file can't be opened, the calls then just go uncached
+        with ApiBase._sessions_lock:
+            if ApiBase._response_cache is None:
+                import sqlite3
+                from .response_cache import ResponseCache
+                max_mb = float(self.config[self.CONTROLLER_SECTION].get('cache_max_mb', 50))
+                try:
+                    ApiBase._response_cache = ResponseCache(max_bytes=int(max_mb * 1024 * 1024))
+                except sqlite3.Error as err:
+                    sys.stderr.write(f'Response cache disabled, could not open it: {err}\n')
+                    ApiBase._response_cache = False
+            return ApiBase._response_cache or None
+
+    def _get_cache_scope(self, section, kwargs):
+        # cached responses are only shared between calls made as the same identity
+        if kwargs.get('auth') is not None:
+            return str(kwargs['auth'][0])
+        options = self.config[section] if self.config.has_section(section) else {}
+        return f'{options.get("client_id")}@{options.get("account_name")}'
+
+    def do_request(self, method, url, section=None, refresh=False, **kwargs):
+        # refresh skips a cached response for this call only, like --refresh does for all of them
+        if section is None:
+            section = self.CONTROLLER_SECTION
+        if RequestProfiler.enabled:
+            return RequestProfiler.profile(method, url,
+                                           lambda: self._do_request(method, url, section, refresh, **kwargs))
+        return self._do_request(method, url, section, refresh, **kwargs)[0]
+
+    def _do_request(self, method, url, section, refresh=False, **kwargs):
+        # returns (response, throttled retries, served from cache)
+        ttl = 0
+        # the cache (and sqlite) is only loaded for the reference endpoints it covers, see cache_policy.py
+        if method.upper() == 'GET' and not getattr(self.args, 'no_cache', False):
+            ttl = get_endpoint_ttl(url, self.config[section] if self.config.has_section(section) else {})
+        cache = self.get_response_cache() if ttl > 0 else None
+        if cache is None:
+            return self._send_request(method, url, section, **kwargs) + (False,)
+        cache_key = cache.make_key(section, url, self._get_cache_scope(section, kwargs))
+        cached = None if refresh or getattr(self.args, 'refresh', False) else cache.get(cache_key)
+        if cached is not None and cached.is_fresh(ttl):
+            self.do_verbose_print(f'Using cached response for {url}')
+            return cached.to_response(), 0, True
+        if cached is not None and (cached.etag or cached.last_modified):
+            headers = dict(kwargs.get('headers') or {})
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+            kwargs['headers'] = headers
+        response, retries = self._send_request(method, url, section, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            self.do_verbose_print(f'Cached response for {url} revalidated')
+            cache.touch(cache_key)
+            return cached.to_response(), retries, True
+        if response.status_code == 200:
+            cache.put(cache_key, response)
+        return response, retries, False
+
+    def _send_request(self, method, url, section, **kwargs):
+        # every api call goes through the pooled session and throttle for its config section
+        session, throttle = self._get_system(url, section)
+        attempt = 0
+        while True:
+            throttle.acquire()
+            response = None
+            try:
+                response = session.request(method, url, **kwargs)
+            finally:
+                throttle.release(response is not None and response.status_code in THROTTLE_STATUS)
+            if not is_retryable(method, response.status_code) or attempt >= throttle.retries:
+                # connection retries done by urllib3 are counted too
+                pool_retries = getattr(response.raw, 'retries', None)
+                return response, attempt + (len(pool_retries.history) if pool_retries else 0)
+            delay = throttle.retry_delay(response, attempt)
+            self.do_verbose_print(f'{method} {url} throttled with {response.status_code}, retrying in {delay:.1f}s')
+            throttle.pause(delay)
+            attempt += 1
+
+    @classmethod
+    def add_cache_arguments(cls, class_commands):
+        class_commands.add_argument('--no_cache', '--no-cache', help='Do not read or write the response cache',
+                                    action='store_true')
+        class_commands.add_argument('--refresh', help='Ignore cached responses but store the new ones',
+                                    action='store_true')
+
+    @classmethod
+    def add_profile_arguments(cls, class_commands):
+        class_commands.add_argument('--profile', help='Print per endpoint request timings when done',
+                                    action='store_true')
+        class_commands.add_argument('--profile_output',
+                                    help='Write request records to a file, .jsonl for json lines otherwise a chrome trace')
+
+    @classmethod
+    def add_format_arguments(cls, class_commands):
+        class_commands.add_argument('--format', help='Output file format, ndjson writes one record per line as it is fetched',
+                                    choices=['json', 'ndjson'], default='json')
+
+    def is_ndjson(self):
+        return getattr(self.args, 'format', 'json') == 'ndjson'
+
+    def write_output(self, data, output=None):
+        output = output or self.args.output
+        with open(output, "w") as outfile:
+            self.do_verbose_print(f'Saving exported file to {output}')
+            if self.is_ndjson() and isinstance(data, list):
+                for record in data:
+                    outfile.write(json.dumps(record) + '\n')
+            else:
+                outfile.write(json.dumps(data))
+
+    def _get_token_lock(self):
+        with ApiBase._sessions_lock:
+            return ApiBase._token_locks.setdefault(self.CONTROLLER_SECTION, threading.Lock())
+
+    @staticmethod
+    def _token_valid(token):
+        # treat tokens about to expire as expired so in flight calls don't fail
+        return token is not None and \
+            token['expiration_time'] - datetime.timedelta(seconds=TOKEN_EXPIRY_MARGIN) > datetime.datetime.now()
+
+    def _get_token_crypt(self):
+        from cryptography.fernet import Fernet
+        section = self.config[self.CONTROLLER_SECTION]
+        if section.get('key') is None or str(section.get('token_cache', 'true')).lower() == 'false':
+            return None
+        return Fernet(str.encode(section['key'], 'UTF-8'))
+
+    def _read_token_cache(self):
+        from cryptography.fernet import InvalidToken
+        fcrypt = self._get_token_crypt()
+        if fcrypt is None or not os.path.exists(TOKEN_CACHE_FILE):
+            return None
+        try:
+            with open(TOKEN_CACHE_FILE, 'r') as cache_file:
+                crypted_token = json.load(cache_file).get(self.CONTROLLER_SECTION)
+            if crypted_token is None:
+                return None
+            token = json.loads(fcrypt.decrypt(str.encode(crypted_token, 'UTF-8')))
+        except (OSError, ValueError, InvalidToken) as err:
+            self.do_verbose_print(f'Ignoring unreadable token cache: {err}')
+            return None
+        if token.get('client_id') != self.config[self.CONTROLLER_SECTION]['client_id']:
+            # config was changed since the token was cached
+            return None
+        token['expiration_time'] = datetime.datetime.fromtimestamp(token['expiration_time'])
+        return token
+
+    def _write_token_cache(self, token):
+        fcrypt = self._get_token_crypt()
+        if fcrypt is None:
+            return
+        cached = dict(token, client_id=self.config[self.CONTROLLER_SECTION]['client_id'],
+                      expiration_time=token['expiration_time'].timestamp())
+        try:
+            cache = {}
+            if os.path.exists(TOKEN_CACHE_FILE):
+                with open(TOKEN_CACHE_FILE, 'r') as cache_file:
+                    cache = json.load(cache_file)
+            cache[self.CONTROLLER_SECTION] = str(fcrypt.encrypt(str.encode(json.dumps(cached))), 'UTF-8')
+            # write then rename so a concurrent cli run never reads a half written file
+            tmp_file = f'{TOKEN_CACHE_FILE}.{os.getpid()}.tmp'
+            with open(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as cache_file:
+                json.dump(cache, cache_file)
+            os.replace(tmp_file, TOKEN_CACHE_FILE)
+        except (OSError, ValueError) as err:
+            self.do_verbose_print(f'Unable to write token cache: {err}')
+
+    def _get_app_data(self):
+        # resolve --application through the shared application directory
+        from .applications import Applications
+        newargs = argparse.Namespace(**vars(self.args))
+        newargs.subparser_name = 'Applications'
+        newargs.function = 'get'
+        newargs.output = None
+        app = Applications(self.config, newargs)
+        app.set_config_prefixes()
+        app.set_app_arg(self.args.application)
+        app_data = app.get_app()
+        return app_data
+
+    def get_workers(self):
+        workers = getattr(self.args, 'workers', None)
+        return max(1, int(workers)) if workers else DEFAULT_WORKERS
+
+    def iter_fan_out(self, func, items, errors):
+        # runs func over items on a bounded pool and yields (item, result) in input order,
+        # failed items are appended to errors as (item, exception) instead of raising
+        workers = self.get_workers()
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # only keep a window of calls in flight so results don't pile up ahead of the consumer
+            pending = collections.deque((item, executor.submit(func, item))
+                                        for item in itertools.islice(items, workers * 2))
+            while pending:
+                item, future = pending.popleft()
+                for next_item in itertools.islice(items, 1):
+                    pending.append((next_item, executor.submit(func, next_item)))
+                try:
+                    result = future.result()
+                except Exception as err:
+                    errors.append((item, err))
+                    continue
+                yield item, result
+
+    def fan_out(self, func, items, description='Request'):
+        items = list(items)
+        errors = []
+        results = [result for item, result in self.iter_fan_out(func, items, errors)]
+        self.report_fan_out_errors(errors, len(items), description)
+        return results
+
+    def fan_out_output(self, func, items, description='Request'):
+        # fan_out that also writes --output, with --format ndjson each record goes to the file as soon
+        # as it arrives and nothing is kept, so there is no result list to return
+        if not self.args.output or not self.is_ndjson():
+            results = self.fan_out(func, items, description)
+            if self.args.output:
+                self.write_output(results)
+            return results
+        items = list(items)
+        errors = []
+        self.do_verbose_print(f'Streaming records to {self.args.output}')
+        # line buffered so readers of the file see each record when it is written
+        with open(self.args.output, "w", buffering=1) as outfile:
+            for item, result in self.iter_fan_out(func, items, errors):
+                outfile.write(json.dumps(result) + '\n')
+        self.report_fan_out_errors(errors, len(items), description)
+        return None
+
+    def report_fan_out_errors(self, errors, total, description='Request'):
+        self.fan_out_errors = errors
+        if not errors:
+            return
+        ApiBase.failed_items += len(errors)
+        sys.stderr.write(f'{description} call failed for {len(errors)} of {total} items:\n')
+        for item, err in errors:
+            sys.stderr.write(f'  {self._fan_out_label(item)}: {err}\n')
+
+    @staticmethod
+    def _fan_out_label(item):
+        # apps and rules print as name (id), pairs of them like app / rule
+        if isinstance(item, dict):
+            return f'{item.get("name")} ({item.get("id")})'
+        if isinstance(item, tuple):
+            return ' / '.join(ApiBase._fan_out_label(part) for part in item)
+        return str(item)
+
     def get_oauth_token(self):
         # print(token_url)
 
-        if self.oauth_token is not None and self.oauth_token['expiration_time'] > datetime.datetime.now():
+        if self._token_valid(self.oauth_token):
             # fixing function to only get token once expired
             self.do_verbose_print(f'Returning valid current token: {self.oauth_token}')
             return self.oauth_token['access_token']
-        self.do_verbose_print(f'Doing get oath token, current token: {self.oauth_token}')
-        client_id = self.config[self.CONTROLLER_SECTION]['client_id']
-        account_name = self.config[self.CONTROLLER_SECTION]['account_name']
-        client_secret = self.config[self.CONTROLLER_SECTION]['client_secret']
-        token_url = self.config[self.CONTROLLER_SECTION]['token_url'] + '?output=json'
-        headers = {"Content-Type": "application/vnd.appd.cntrl+protobuf;v=1"}
-        payload = f'grant_type=client_credentials&client_id={client_id}@{account_name}&client_secret={client_secret}'
-        try:
-            response = requests.post(token_url, data=payload, headers=headers)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as err:
-            raise SystemExit(err)
-        self.do_verbose_print(response)
-        self.do_verbose_print(response.text)
-        self.oauth_token = response.json()
-        self.oauth_token['expiration_time'] = datetime.datetime.now() + \
-            datetime.timedelta(seconds=self.oauth_token['expires_in'])
-        self.do_verbose_print(self.oauth_token)
+        # single flight, only one thread per system refreshes while the rest wait for its token
+        with self._get_token_lock():
+            token = ApiBase._tokens.get(self.CONTROLLER_SECTION)
+            if not self._token_valid(token):
+                token = self._read_token_cache()
+            if self._token_valid(token):
+                self.do_verbose_print(f'Returning cached token expiring {token["expiration_time"]}')
+                ApiBase._tokens[self.CONTROLLER_SECTION] = token
+                self.oauth_token = token
+                return self.oauth_token['access_token']
+            self.do_verbose_print(f'Doing get oath token, current token: {self.oauth_token}')
+            client_id = self.config[self.CONTROLLER_SECTION]['client_id']
+            account_name = self.config[self.CONTROLLER_SECTION]['account_name']
+            client_secret = self.config[self.CONTROLLER_SECTION]['client_secret']
+            token_url = self.config[self.CONTROLLER_SECTION]['token_url'] + '?output=json'
+            headers = {"Content-Type": "application/vnd.appd.cntrl+protobuf;v=1"}
+            payload = f'grant_type=client_credentials&client_id={client_id}@{account_name}&client_secret={client_secret}'
+            try:
+                response = self.do_request('POST', token_url, data=payload, headers=headers)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as err:
+                raise SystemExit(err)
+            self.do_verbose_print(response)
+            self.do_verbose_print(response.text)
+            self.oauth_token = response.json()
+            self.oauth_token['expiration_time'] = datetime.datetime.now() + \
+                datetime.timedelta(seconds=self.oauth_token['expires_in'])
+            self.do_verbose_print(self.oauth_token)
+            ApiBase._tokens[self.CONTROLLER_SECTION] = self.oauth_token
+            self._write_token_cache(self.oauth_token)
 
         return self.oauth_token['access_token']
 
@@ -72,6 +407,7 @@ class ApiBase:
         headers = None
         if self.args.auth == 'user':
             self.do_verbose_print('Doing api call with user auth...')
+            from cryptography.fernet import Fernet
             crypt_key = str.encode(self.config[self.CONTROLLER_SECTION]['key'], 'UTF-8')
             fcrypt = Fernet(crypt_key)
             passwd = fcrypt.decrypt(str.encode(self.config[self.CONTROLLER_SECTION]['psw'], 'UTF-8'))
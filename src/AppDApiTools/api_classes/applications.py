@@ -1,13 +1,71 @@
+import fnmatch
 import json
 import sys
+import threading
 
-from cryptography.fernet import Fernet
 import requests
 import logging
 import argparse
 from .api_base import ApiBase
 
 
+class ApplicationDirectory:
+    # one directory per controller system for the whole process
+    _directories = {}
+    _lock = threading.Lock()
+
+    def __init__(self, app_list):
+        self.apps = app_list
+        self.by_id = {str(app['id']): app for app in app_list}
+        self.by_name = {app['name']: app for app in app_list}
+        self.by_lower_name = {}
+        for app in app_list:
+            self.by_lower_name.setdefault(app['name'].lower(), []).append(app)
+
+    @classmethod
+    def get(cls, api, refresh=False):
+        directory_key = (api.CONTROLLER_SECTION, api.config[api.CONTROLLER_SECTION]['base_url'])
+        with cls._lock:
+            if refresh or directory_key not in cls._directories:
+                cls._directories[directory_key] = cls(cls._load_app_list(api))
+            return cls._directories[directory_key]
+
+    @classmethod
+    def _load_app_list(cls, api):
+        # between runs the list comes from the response cache, see response_cache.py
+        output_reset = api.args.output
+        api.args.output = None
+        app_list = api.get_app_list()
+        api.args.output = output_reset
+        return app_list
+
+    def all(self):
+        return [dict(app) for app in self.apps]
+
+    def find_name(self, name):
+        # exact name, then case-insensitive, then glob patterns like "Prod-*"
+        if name in self.by_name:
+            return [self.by_name[name]]
+        lower_name = name.lower()
+        if lower_name in self.by_lower_name:
+            return self.by_lower_name[lower_name]
+        if any(c in name for c in '*?['):
+            return [app for app in self.apps if fnmatch.fnmatchcase(app['name'].lower(), lower_name)]
+        return []
+
+    def lookup(self, ids=None, names=None):
+        # copies are returned since callers decorate the app dicts with their results
+        found = {}
+        for app_id in ids or []:
+            app = self.by_id.get(str(app_id).strip())
+            if app is not None:
+                found.setdefault(app['id'], app)
+        for name in names or []:
+            for app in self.find_name(name.strip()):
+                found.setdefault(app['id'], app)
+        return [dict(app) for app in found.values()]
+
+
 class Applications(ApiBase):
 
     @classmethod
@@ -27,6 +85,10 @@ class Applications(ApiBase):
         class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
         class_commands.add_argument('--name', help='Set the name of the application')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        class_commands.add_argument('--workers', help='Number of applications to call concurrently', type=int, default=4)
+        cls.add_format_arguments(class_commands)
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -57,25 +119,17 @@ class Applications(ApiBase):
         headers, auth = self.set_auth_headers()
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         app_data = self.get_app()
-        event_data = []
-        for app in app_data:
+
+        def get_app_events(app):
             # &event-types=APPLICATION_ERROR,DIAGNOSTIC_SESSION,APPLICATION_DEPLOYMENT
             url = f'controller/rest/applications/{app["id"]}/events?time-range-type=BEFORE_NOW&duration-in-mins=30&event-types={",".join(event_types)}&severities=INFO,WARN,ERROR&output=JSON'
-            try:
-                # response = requests.get(url, headers=headers)
-                response = requests.get(base_url + url, auth=auth, headers=headers)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Application Event list call returned HTTPError: {err}')
-            app['events'] = response.json()
-            event_data.append(app)
-            self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
-        json_obj = json.dumps(event_data)
-        if self.args.output:
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return event_data
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            app = dict(app, events=response.json())
+            self.do_verbose_print(json.dumps(app['events'])[0:200] + '...')
+            return app
+
+        return self.fan_out_output(get_app_events, app_data, 'Application Event list')
 
     def set_app_arg(self, application_identifier):
         if str(application_identifier).upper() == 'ALL':
@@ -103,14 +157,12 @@ class Applications(ApiBase):
         if self.args.name is None and self.args.id is None:
             print(f'Application get requires --name or --id, see --help')
             sys.exit()
-        output_reset = self.args.output
-        self.args.output = None
-        app_list = self.get_app_list()
+        directory = ApplicationDirectory.get(self)
 
         app_element = []
         if self.args.name == 'ALL':
             # want all so just return list
-            app_element = app_list
+            app_element = directory.all()
         else:
             ids = []
             names = []
@@ -126,47 +178,23 @@ class Applications(ApiBase):
                     names.append(self.args.name)
             self.do_verbose_print(f"Searching for these app id's: {ids}")
             self.do_verbose_print(f"Searching for these app name's: {names}")
-            for app in app_list:
-                self.do_verbose_print(f"Searching app: {app}")
-                if str(app["id"]) in ids:
-                    app_element.append(app)
-                if app["name"] in names:
-                    app_element.append(app)
+            app_element = directory.lookup(ids, names)
         self.do_verbose_print(json.dumps(app_element)[0:200] + '...')
-        self.args.output = output_reset
         if self.args.output:
-            json_obj = json.dumps(app_element)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving app data to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(app_element)
         return app_element
 
     def get_app_list(self):
         self.do_verbose_print('Doing Applications List...')
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
-        if self.args.auth == 'user':
-            self.do_verbose_print('Doing export with user auth...')
-            crypt_key = str.encode(self.config[self.CONTROLLER_SECTION]['key'], 'UTF-8')
-            fcrypt = Fernet(crypt_key)
-            passwd = fcrypt.decrypt(str.encode(self.config[self.CONTROLLER_SECTION]['psw'], 'UTF-8'))
-            auth = (self.config[self.CONTROLLER_SECTION]['user'] + '@' + self.config[self.CONTROLLER_SECTION]['account_name'],
-                    passwd)
-            headers = None
-        else:
-            self.do_verbose_print('Doing export with token auth...')
-            token = self.get_oauth_token()
-            headers = {"Authorization": "Bearer " + token}
-            auth = None
+        headers, auth = self.set_auth_headers()
         try:
-            response = requests.get(base_url+'controller/rest/applications?output=JSON', headers=headers, auth=auth)
+            response = self.do_request('GET', base_url+'controller/rest/applications?output=JSON', headers=headers, auth=auth)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Dashboard api export call returned HTTPError: {err}')
         app_data = response.json()
         self.do_verbose_print(json.dumps(app_data)[0:200]+'...')
         if self.args.output:
-            json_obj = json.dumps(app_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(app_data)
         return app_data
@@ -27,6 +27,7 @@ class Backends(ApiBase):
         class_commands.add_argument('--csv_fields', help='The fields to output in csv from json along with main backend fields comma delimited')
         class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -67,7 +68,7 @@ class Backends(ApiBase):
         base_url = self.config['CONTROLLER_INFO']['base_url']
         headers, auth = self.set_auth_headers()
         url = base_url + 'controller/rest/applications/' + self.args.name + '/backends?output=JSON'
-        response = requests.get(url, auth=auth, headers=headers)
+        response = self.do_request('GET', url, auth=auth, headers=headers)
         self.do_verbose_print(response.json())
         if self.args.output is not None:
             if '.csv' in self.args.output:
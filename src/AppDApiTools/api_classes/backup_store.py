@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class BackupStore:
+    """Incremental dashboard backups, content addressed blobs plus a manifest per run.
+
+    blobs/<sha256>.json holds each distinct normalized dashboard once and manifests/<run>.json lists
+    the id, name, modifiedOn and blob of every dashboard in that run, so any run can be rebuilt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.blob_dir = os.path.join(path, 'blobs')
+        self.manifest_dir = os.path.join(path, 'manifests')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize(dashboard):
+        return json.dumps(dashboard, sort_keys=True, separators=(',', ':'))
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest + '.json')
+
+    def has_blob(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def put(self, dashboard):
+        # returns (digest, True when a new blob was written)
+        body = self.normalize(dashboard).encode('UTF-8')
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(body)
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def get(self, digest):
+        with open(self.blob_path(digest), 'rb') as infile:
+            return json.loads(infile.read())
+
+    def manifests(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(self.manifest_dir) if name.endswith('.json'))
+
+    def read_manifest(self, name=None):
+        # the latest run when no name is given, an empty manifest for a new store
+        if name is None:
+            names = self.manifests()
+            if not names:
+                return {'dashboards': []}
+            name = names[-1]
+        with open(os.path.join(self.manifest_dir, name + '.json'), 'r') as infile:
+            return json.load(infile)
+
+    def write_manifest(self, entries, source):
+        name = datetime.now().strftime("%Y_%m_%d-%H_%M_%S")
+        counter = 1
+        while os.path.exists(os.path.join(self.manifest_dir, name + '.json')):
+            counter += 1
+            name = datetime.now().strftime("%Y_%m_%d-%H_%M_%S") + f'-{counter}'
+        manifest = {'created': datetime.now().isoformat(), 'source': source,
+                    'dashboards': sorted(entries, key=lambda entry: str(entry['id']))}
+        path = os.path.join(self.manifest_dir, name + '.json')
+        with open(path + '.tmp', 'w') as outfile:
+            json.dump(manifest, outfile, indent=1)
+        os.replace(path + '.tmp', path)
+        return name
@@ -0,0 +1,19 @@
+import re
+from urllib.parse import urlparse
+
+# reference data that rarely changes, (name, url path pattern, default ttl seconds)
+# each ttl can be overridden per system with cache_ttl_<name> in config.ini, 0 disables it
+CACHED_ENDPOINTS = [
+    ('applications', re.compile(r'controller/rest/applications$'), 300),
+    ('metric_tree', re.compile(r'controller/rest/applications/[^/]+/metrics$'), 3600),
+    ('roles', re.compile(r'controller/api/rbac/v1/roles/.+$'), 3600),
+    ('synthetic_schedules', re.compile(r'v1/synthetic/(api/)?schedule$'), 300),
+]
+
+
+def get_endpoint_ttl(url, options):
+    path = urlparse(url).path
+    for name, pattern, ttl in CACHED_ENDPOINTS:
+        if pattern.search(path):
+            return int(options.get(f'cache_ttl_{name}', ttl))
+    return 0
@@ -0,0 +1,103 @@
+import collections
+import hashlib
+import json
+
+# marks a property that only exists on one side of a diff
+MISSING = object()
+
+
+def node_hash(node, hashes):
+    # containers are hashed bottom up once and cached by id, so equal subtrees compare in O(1)
+    if not isinstance(node, (dict, list)):
+        return b'v' + json.dumps(node).encode('UTF-8')
+    digest = hashes.get(id(node))
+    if digest is not None:
+        return digest
+    sha = hashlib.sha1(b'{' if isinstance(node, dict) else b'[')
+    if isinstance(node, dict):
+        for key in sorted(node):
+            sha.update(json.dumps(key).encode('UTF-8'))
+            sha.update(node_hash(node[key], hashes))
+    else:
+        for value in node:
+            sha.update(node_hash(value, hashes))
+    digest = hashes[id(node)] = sha.digest()
+    return digest
+
+
+def widget_label(widget):
+    title = f' "{widget["title"]}"' if widget.get('title') else ''
+    return f'{widget.get("widgetType")}{title} at {widget.get("x")},{widget.get("y")}'
+
+
+def match_widgets(old_widgets, new_widgets, hashes):
+    # pair identical widgets by hash first, then what is left by type and position, then by type and title
+    keys = [
+        lambda widget: node_hash(widget, hashes),
+        lambda widget: (widget.get('widgetType'), widget.get('x'), widget.get('y')),
+        lambda widget: (widget.get('widgetType'), widget.get('title')),
+    ]
+    pairs = []
+    old_left, new_left = list(old_widgets), list(new_widgets)
+    for key in keys:
+        buckets = collections.defaultdict(collections.deque)
+        for widget in old_left:
+            buckets[key(widget)].append(widget)
+        unmatched = []
+        for widget in new_left:
+            bucket = buckets.get(key(widget))
+            if bucket:
+                pairs.append((bucket.popleft(), widget))
+            else:
+                unmatched.append(widget)
+        matched = {id(old) for old, new in pairs}
+        old_left = [widget for widget in old_left if id(widget) not in matched]
+        new_left = unmatched
+    return pairs, old_left, new_left
+
+
+def diff_dashboards(old, new):
+    """Compact list of changed properties between two dashboard exports, widgets matched by identity."""
+    hashes = {}
+    changes = []
+    if node_hash(old, hashes) == node_hash(new, hashes):
+        return changes
+    for key in _keys(old, new):
+        if key != 'widgetTemplates':
+            _diff(old.get(key, MISSING), new.get(key, MISSING), key, None, changes, hashes)
+    pairs, removed, added = match_widgets(old.get('widgetTemplates') or [], new.get('widgetTemplates') or [], hashes)
+    for old_widget, new_widget in pairs:
+        _diff(old_widget, new_widget, '', widget_label(new_widget), changes, hashes)
+    for widget in removed:
+        changes.append({'widget': widget_label(widget), 'path': '', 'change': 'removed'})
+    for widget in added:
+        changes.append({'widget': widget_label(widget), 'path': '', 'change': 'added'})
+    return changes
+
+
+def _keys(old, new):
+    return list(old) + [key for key in new if key not in old]
+
+
+def _diff(old, new, path, widget, changes, hashes):
+    if old is MISSING:
+        changes.append({'widget': widget, 'path': path, 'change': 'added', 'new': new})
+        return
+    if new is MISSING:
+        changes.append({'widget': widget, 'path': path, 'change': 'removed', 'old': old})
+        return
+    if isinstance(old, (dict, list)) and type(old) is type(new):
+        # identical subtrees are skipped without walking them
+        if node_hash(old, hashes) == node_hash(new, hashes):
+            return
+        if isinstance(old, dict):
+            for key in _keys(old, new):
+                _diff(old.get(key, MISSING), new.get(key, MISSING), f'{path}.{key}' if path else key,
+                      widget, changes, hashes)
+        else:
+            for i in range(max(len(old), len(new))):
+                _diff(old[i] if i < len(old) else MISSING, new[i] if i < len(new) else MISSING, f'{path}[{i}]',
+                      widget, changes, hashes)
+        return
+    if old != new or type(old) is not type(new):
+        changes.append({'widget': widget, 'path': path, 'change': 'changed', 'old': old, 'new': new})
@@ -0,0 +1,81 @@
+import collections
+import os
+import sqlite3
+import time
+
+DASHBOARD_INDEX_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                                    'dashboard_index.db')
+
+# widget properties worth finding dashboards by, property name: reference type
+REFERENCE_KEYS = {
+    'applicationName': 'application',
+    'entityName': 'entity',
+    'metricPath': 'metric_path',
+    'relativeMetricPath': 'metric_path',
+    'widgetType': 'widget_type',
+}
+REFERENCE_TYPES = sorted(set(REFERENCE_KEYS.values()))
+
+
+def extract_references(dashboard):
+    # Counter of (reference type, value) over every widget property in REFERENCE_KEYS
+    references = collections.Counter()
+    stack = [dashboard.get('widgetTemplates') or []]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        for key, value in node.items():
+            if isinstance(value, (dict, list)):
+                stack.append(value)
+            elif key in REFERENCE_KEYS and value not in (None, ''):
+                references[(REFERENCE_KEYS[key], str(value))] += 1
+    return references
+
+
+class DashboardIndex:
+    """Inverted index in sqlite of what each dashboard references, kept up to date incrementally."""
+
+    def __init__(self, path=DASHBOARD_INDEX_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS dashboards (
+                            id INTEGER PRIMARY KEY, name TEXT, modified_on INTEGER, sha256 TEXT, indexed REAL)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS dashboard_refs (
+                            ref_type TEXT, value TEXT, dashboard_id INTEGER, count INTEGER,
+                            PRIMARY KEY (ref_type, value, dashboard_id)) WITHOUT ROWID''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS dashboard_refs_dashboard ON dashboard_refs (dashboard_id)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS dashboard_refs_value ON dashboard_refs (value)')
+        self.db.commit()
+
+    def indexed(self):
+        # {dashboard id: (modified_on, sha256)} of what is in the index now
+        return {row[0]: (row[1], row[2]) for row in self.db.execute('SELECT id, modified_on, sha256 FROM dashboards')}
+
+    def update(self, dashboard_id, dashboard, modified_on=None, sha256=None):
+        self.remove([dashboard_id])
+        self.db.execute('INSERT INTO dashboards VALUES (?, ?, ?, ?, ?)',
+                        (dashboard_id, dashboard.get('name'), modified_on, sha256, time.time()))
+        self.db.executemany('INSERT INTO dashboard_refs VALUES (?, ?, ?, ?)',
+                            [(ref_type, value, dashboard_id, count)
+                             for (ref_type, value), count in extract_references(dashboard).items()])
+
+    def remove(self, dashboard_ids):
+        for dashboard_id in dashboard_ids:
+            self.db.execute('DELETE FROM dashboard_refs WHERE dashboard_id = ?', (dashboard_id,))
+            self.db.execute('DELETE FROM dashboards WHERE id = ?', (dashboard_id,))
+
+    def commit(self):
+        self.db.commit()
+
+    def query(self, ref_type, pattern):
+        # exact match on the primary key unless the pattern has glob characters
+        operator = 'GLOB' if any(c in pattern for c in '*?[') else '='
+        sql = ('SELECT d.id, d.name, r.ref_type, r.value, r.count FROM dashboard_refs r '
+               'JOIN dashboards d ON d.id = r.dashboard_id WHERE r.value ' + operator + ' ?')
+        params = [pattern]
+        if ref_type:
+            sql += ' AND r.ref_type = ?'
+            params.append(ref_type)
+        return [dict(zip(('id', 'name', 'ref_type', 'value', 'count'), row))
+                for row in self.db.execute(sql + ' ORDER BY d.name, r.ref_type, r.value', params)]
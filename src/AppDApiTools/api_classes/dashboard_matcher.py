@@ -0,0 +1,122 @@
+import re
+
+# marks a search rule without a "key", it applies to every widget property
+ANY_KEY = object()
+
+
+class SearchRule:
+    """One builder config search pattern, regexes compiled once."""
+
+    def __init__(self, index, pattern):
+        self.index = index
+        self.key = pattern["key"] if "key" in pattern else ANY_KEY
+        self.value = pattern["value"]
+        self.text = str(pattern["value"])
+        self.regex = re.compile(pattern["value"]) if pattern.get("regex") else None
+
+    def apply(self, target, replace):
+        if self.regex is not None:
+            # regexes only make sense on strings, numbers and nulls pass through
+            return self.regex.sub(replace["value"], target) if isinstance(target, str) else target
+        if isinstance(target, str):
+            return target.replace(self.text, str(replace["value"]))
+        if isinstance(target, (int, float)):
+            return replace["value"] if target == self.value else target
+        return target
+
+
+class RuleTable:
+    """The rules that apply to one property key, plus a quick test for values none of them touch."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        literals = [rule.text for rule in rules if rule.regex is None]
+        # one alternation over every literal search instead of a str.replace per rule
+        self.literals = re.compile('|'.join(re.escape(text) for text in literals)) if literals else None
+        self.regexes = [rule.regex for rule in rules if rule.regex is not None]
+        self.numbers = {rule.value for rule in rules
+                        if rule.regex is None and isinstance(rule.value, (int, float))}
+
+    def may_change(self, target):
+        if isinstance(target, str):
+            if self.literals is not None and self.literals.search(target):
+                return True
+            return any(regex.search(target) for regex in self.regexes)
+        if isinstance(target, (int, float)):
+            return target in self.numbers
+        return False
+
+
+class ReplaceMatcher:
+    """Builder config search patterns compiled once for Dashboards search and replace.
+
+    Rules are grouped into a table per widget key so a property only sees the rules scoped to it.
+    Values no rule can change are returned as is, anything else runs the rules in order so
+    a replacement can still feed the rules after it.
+    """
+
+    def __init__(self, search):
+        # search is the normalized builder config search list
+        self.rules = [SearchRule(index, pattern) for index, pattern in enumerate(search)]
+        self.tables = {}
+
+    def table(self, key):
+        table = self.tables.get(key)
+        if table is None:
+            table = RuleTable([rule for rule in self.rules if rule.key is ANY_KEY or rule.key == key])
+            self.tables[key] = table
+        return table
+
+    def may_change(self, key, target):
+        table = self.table(key)
+        return bool(table.rules) and table.may_change(target)
+
+    def apply(self, key, target, replace):
+        table = self.table(key)
+        if not table.rules or not table.may_change(target):
+            return target
+        for rule in table.rules:
+            target = rule.apply(target, replace[rule.index])
+        return target
+
+
+class WidgetTemplate:
+    """A widget analysed once against a ReplaceMatcher and rendered per replace row.
+
+    Only the leaves the search can change, and the containers on the way to them, are copied for
+    each row, every other part of the widget is shared with the template.
+    """
+
+    def __init__(self, widget, matcher):
+        self.widget = widget
+        self.matcher = matcher
+        self.touched = self._analyse(widget)
+
+    def _analyse(self, node):
+        # {key: nested touched map for a container, None for a leaf that may change}
+        touched = {}
+        for key in node if isinstance(node, dict) else range(len(node)):
+            value = node[key]
+            if isinstance(value, (dict, list)):
+                nested = self._analyse(value)
+                if nested:
+                    touched[key] = nested
+            elif self.matcher.may_change(key, value):
+                touched[key] = None
+        return touched
+
+    def render(self, replace, on_change=None):
+        # the widget itself is always a fresh dict so callers can move it with x and y
+        return self._render(self.widget, self.touched, replace, on_change)
+
+    def _render(self, node, touched, replace, on_change):
+        rendered = dict(node) if isinstance(node, dict) else list(node)
+        for key, nested in touched.items():
+            if nested is not None:
+                rendered[key] = self._render(node[key], nested, replace, on_change)
+                continue
+            old = node[key]
+            rendered[key] = self.matcher.apply(key, old, replace)
+            if on_change is not None and rendered[key] != old:
+                on_change(old, rendered[key])
+        return rendered
@@ -1,17 +1,23 @@
+import argparse
 import base64
-import copy
+import contextlib
+import fnmatch
 import difflib
 import json
 import os.path
-import re
 import sys
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from functools import reduce
-from cryptography.fernet import Fernet
+from functools import partial, reduce
 import requests
 import logging
 from .api_base import ApiBase
+from .backup_store import BackupStore
+from .dashboard_diff import diff_dashboards
+from .dashboard_index import DashboardIndex, DASHBOARD_INDEX_FILE, REFERENCE_TYPES
+from .dashboard_matcher import ReplaceMatcher, WidgetTemplate
 
 
 class Dashboards(ApiBase):
@@ -26,11 +32,22 @@ class Dashboards(ApiBase):
             'duplicate',
             'backup',
             'multi_dupe',
+            'restore',
+            'index',
+            'query',
+            'diff',
             # 'convert_absolute',
         ]
         class_commands = subparser.add_parser('Dashboards', help='Dashboards commands')
         class_commands.add_argument('function', choices=functions, help='The Dashboards api function to run')
-        class_commands.add_argument('--id', help='Specific dashboard id or comma list')
+        class_commands.add_argument('--id', help='Specific dashboard id or comma list, backup also takes all')
+        class_commands.add_argument('--store', help='Incremental backup store directory, used instead of a zip')
+        class_commands.add_argument('--snapshot', help='Backup store run to restore, defaults to the latest')
+        class_commands.add_argument('--match', help='Only restore dashboards whose name matches this glob')
+        class_commands.add_argument('--prefix', help='Prefix added to the name of each restored dashboard')
+        class_commands.add_argument('--index', help='Dashboard reference index database', default=DASHBOARD_INDEX_FILE)
+        class_commands.add_argument('--ref_type', help='Reference type to query', choices=REFERENCE_TYPES)
+        class_commands.add_argument('--ref', help='Reference value or glob to query the index for')
         class_commands.add_argument('--builder_config', help='Search and replace config file in json')
         class_commands.add_argument('--input', help='The input template created with the AppDynamics UI')
         class_commands.add_argument('--output', help='The output file.', nargs='?', const='dashboard_name')
@@ -38,6 +55,8 @@ class Dashboards(ApiBase):
         class_commands.add_argument('--prettify', help='Prettify the json output', action='store_true')
         class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
         class_commands.add_argument('--name', help='Set the name of the new dashboard', default=False)
+        class_commands.add_argument('--workers', help='Number of dashboards to import concurrently', type=int, default=4)
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -54,6 +73,14 @@ class Dashboards(ApiBase):
             dash.backup()
         if args.function == 'multi_dupe':
             dash.multi_dupe()
+        if args.function == 'restore':
+            dash.restore()
+        if args.function == 'index':
+            dash.build_index()
+        if args.function == 'query':
+            dash.query_index()
+        if args.function == 'diff':
+            dash.diff()
 
     def __init__(self, config, args):
         super().__init__(config, args)
@@ -82,16 +109,39 @@ class Dashboards(ApiBase):
             if os.path.isdir(self.args.output):
                 multi_dir = self.args.output
                 multi_output = True
-        conf_counter = 1
-        for config in config_list:
-            # input is 1 to many so leave --id and --input parms as is
+        if not config_list:
+            config_list = [self.args.builder_config]
+        # the source is the same for every config so fetch it once
+        self.args.output = None
+        source_dash = self._get_source_dashboard()
+        builder_configs = {}
+        for conf_counter, config in enumerate(config_list, 1):
             self.args.builder_config = config
             self._get_builder_config()
-            self.args.output = None
-            if multi_output:
-                self.args.output = os.path.join(multi_dir, self._get_option("setNewName", str(conf_counter))+".json")
-            self.duplicate()
-
+            self._confirm_extend_widgets()
+            builder_configs[config] = (conf_counter, self.builder_config)
+
+        # rendering is cpu bound so it runs in processes, importing is io bound and shares the thread fan out
+        processes = max(1, min(len(builder_configs), os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            def dupe_config(config):
+                conf_counter, builder_config = builder_configs[config]
+                result_dash = pool.submit(render_dashboard, source_dash, builder_config, self.args.verbose).result()
+                if self.args.name:
+                    result_dash["name"] = self.args.name
+                if multi_output:
+                    new_name = builder_config.get("options", {}).get("setNewName", str(conf_counter))
+                    d_file = os.path.join(multi_dir, new_name + ".json")
+                    with open(d_file, "w") as outfile:
+                        outfile.write(self._dump_dashboard(result_dash))
+                    return f'written to {d_file}'
+                self._post_dashboard(result_dash)
+                return f'imported as {result_dash["name"]}'
+
+            errors = []
+            for config, result in self.iter_fan_out(dupe_config, list(builder_configs), errors):
+                print(f'{config}: {result}')
+        self.report_fan_out_errors(errors, len(builder_configs), 'Dashboard duplicate')
         return
 
     def do_import(self, dashboard=None):
@@ -105,31 +155,23 @@ class Dashboards(ApiBase):
             self.do_verbose_print(f'Loading dashboard input from {self.args.input}')
             dashboard = json.loads(open(self.args.input, "r").read())
             dash_file_name = os.path.basename(self.args.input)
-        dashboard = {'file': (dash_file_name, json.dumps(dashboard))}
-        if self.args.auth == 'user':
-            self.do_verbose_print('Doing export with user auth...')
-            crypt_key = str.encode(self.config['CONTROLLER_INFO']['key'], 'UTF-8')
-            fcrypt = Fernet(crypt_key)
-            passwd = fcrypt.decrypt(str.encode(self.config['CONTROLLER_INFO']['psw'], 'UTF-8'))
-            auth = (self.config['CONTROLLER_INFO']['user'] + '@' + self.config['CONTROLLER_INFO']['account_name'],
-                    passwd)
-            headers = None
-        else:
-            self.do_verbose_print('Doing export with token auth...')
-            token = self.get_oauth_token()
-            headers = {"Authorization": "Bearer " + token}
-            auth = None
-        base_url = self.config['CONTROLLER_INFO']['base_url']
-        url = base_url + 'controller/CustomDashboardImportExportServlet?output=JSON'
         try:
-            response = requests.post(url, auth=auth, files=dashboard, headers=headers)
-            response.raise_for_status()
+            dash_data = self._post_dashboard(dashboard, dash_file_name)
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Dashboard api export call returned HTTPError: {err}')
-        dash_data = response.json()
         self.do_verbose_print(json.dumps(dash_data)[0:200]+'...')
         return dash_data
 
+    def _post_dashboard(self, dashboard, dash_file_name='dashboard.json'):
+        # raises HTTPError so concurrent callers can report per dashboard failures
+        dashboard = {'file': (dash_file_name, json.dumps(dashboard))}
+        headers, auth = self.set_auth_headers()
+        base_url = self.config['CONTROLLER_INFO']['base_url']
+        url = base_url + 'controller/CustomDashboardImportExportServlet?output=JSON'
+        response = self.do_request('POST', url, auth=auth, files=dashboard, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
     def do_export(self):
 
         self.set_request_logging()
@@ -138,33 +180,13 @@ class Dashboards(ApiBase):
             print('No dashboard id specified with --id, see --help')
             sys.exit()
         self.do_verbose_print(f'Attempting to export dashboard with id={self.args.id}')
-        if self.args.auth == 'user':
-            self.do_verbose_print('Doing export with user auth...')
-            crypt_key = str.encode(self.config['CONTROLLER_INFO']['key'], 'UTF-8')
-            fcrypt = Fernet(crypt_key)
-            passwd = fcrypt.decrypt(str.encode(self.config['CONTROLLER_INFO']['psw'], 'UTF-8'))
-            auth = (self.config['CONTROLLER_INFO']['user'] + '@' + self.config['CONTROLLER_INFO']['account_name'],
-                    passwd)
-            headers = None
-        else:
-            self.do_verbose_print('Doing export with token auth...')
-            token = self.get_oauth_token()
-            headers = {"Authorization": "Bearer " + token}
-            auth = None
-        base_url = self.config['CONTROLLER_INFO']['base_url']
-        url = base_url + 'controller/CustomDashboardImportExportServlet?dashboardId=' + self.args.id + '&output=JSON'
         try:
-            #response = requests.get(url, headers=headers)
-            response = requests.get(url, auth=auth, headers=headers)
-            response.raise_for_status()
+            dash_data = self._export_dashboard(self.args.id)
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Dashboard api export call returned HTTPError: {err}')
-        dash_data = response.json()
-        self.do_verbose_print(json.dumps(dash_data)[0:200] + '...')
-        try:
-            d_file = dash_data['name'].strip() + ".json"
         except KeyError as err:
             raise SystemExit(f'Dashboard element: {err} not found, likely invalid dashboard id')
+        d_file = dash_data['name'].strip() + ".json"
         json_obj = json.dumps(dash_data)
         if self.args.output:
             if self.args.output != 'dashboard_name':
@@ -176,6 +198,32 @@ class Dashboards(ApiBase):
 
         return dash_data
 
+    def _export_dashboard(self, dashboard_id):
+        # raises HTTPError or KeyError so concurrent callers can report per dashboard failures
+        headers, auth = self.set_auth_headers()
+        base_url = self.config['CONTROLLER_INFO']['base_url']
+        url = base_url + 'controller/CustomDashboardImportExportServlet?dashboardId=' + str(dashboard_id) + '&output=JSON'
+        response = self.do_request('GET', url, auth=auth, headers=headers)
+        response.raise_for_status()
+        dash_data = response.json()
+        self.do_verbose_print(json.dumps(dash_data)[0:200] + '...')
+        if 'name' not in dash_data:
+            # an unknown id comes back as an empty export
+            raise KeyError('name')
+        return dash_data
+
+    def _get_dashboard_list(self):
+        # id, name and modifiedOn of every dashboard on the controller
+        headers, auth = self.set_auth_headers()
+        base_url = self.config['CONTROLLER_INFO']['base_url']
+        try:
+            response = self.do_request('GET', base_url + 'controller/restui/dashboards/getAllDashboardsByType/false',
+                                       auth=auth, headers=headers)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            raise SystemExit(f'Dashboard api list call returned HTTPError: {err}')
+        return response.json()
+
     # Process the options. If an option is not set, return the default value
     def _get_option(self, option, default):
         if "options" not in self.builder_config:
@@ -243,7 +291,9 @@ class Dashboards(ApiBase):
 
         new_widgets = []
         i = 1 if extend_widgets else 0
-        search = self._normalize_pattern(self.builder_config["search"])
+        search = ReplaceMatcher(self._normalize_pattern(self.builder_config["search"]))
+        # analyse each widget once, rows then only copy what the search can change
+        templates = [WidgetTemplate(widget, search) for widget in dashboard["widgetTemplates"]]
         # Walk over all search&replace patterns and create a new "row" for each of them.
         for replace in self._normalize_pattern(self.builder_config["replace"]):
             y_offset = i * max_y + top_offset
@@ -255,15 +305,15 @@ class Dashboards(ApiBase):
                     x_offset = j * max_x + left_offset
                     if (j + 1) * max_y + left_offset > dashboard["width"]:
                         dashboard["width"] = (j + 1) * max_y + left_offset
-                    for widget in dashboard["widgetTemplates"]:
-                        c = self._walk(copy.deepcopy(widget), search, column)
+                    for template in templates:
+                        c = self._render_widget(template, column)
                         c["y"] += y_offset
                         c["x"] += x_offset
                         new_widgets.append(c)
                     j += 1
             else:
-                for widget in dashboard["widgetTemplates"]:
-                    c = self._walk(copy.deepcopy(widget), search, replace)
+                for template in templates:
+                    c = self._render_widget(template, replace)
                     c["y"] += y_offset
                     new_widgets.append(c)
             i += 1
@@ -278,26 +328,12 @@ class Dashboards(ApiBase):
 
         return dashboard
 
-    def _walk(self, widget, search, replace):
-        for key in widget if isinstance(widget, dict) else range(len(widget)):
-            widget[key] = self._process_widget_property(widget[key], key, search, replace)
-
-        return widget
-
-    # Process a single property of a widget
-    def _process_widget_property(self, prop, key, search, replace):
-        # Walk recursively if the property is a list or dict
-        if isinstance(prop, (dict, list)):
-            return self._walk(prop, search, replace)
-
-        old = prop
-        for i in range(len(search)):
-            prop = self._search_and_replace(search[i], key, replace[i], prop)
-
-        if old != prop:
-            self.do_verbose_print(f'Modifying Property: {self._show_diff(old, prop)}')
-
-        return prop
+    def _render_widget(self, template, replace):
+        if not self.args.verbose:
+            return template.render(replace)
+        # the diff is only worth building when someone will see it
+        return template.render(replace, lambda old, new: self.do_verbose_print(
+            f'Modifying Property: {self._show_diff(old, new)}'))
 
     # Source: http://stackoverflow.com/questions/774316/python-difflib-highlighting-differences-inline
     def _show_diff(self, old, new) -> str:
@@ -312,49 +348,265 @@ class Dashboards(ApiBase):
                 output.append("\033[91m" + seqm.b[b0:b1] + "\033[00m")
         return ''.join(output)
 
-    # Apply search and replace patterns onto a value
-    def _search_and_replace(self, search, key, replace, target):
-        # self.do_verbose_print(str(search)+':'+str(key)+':'+str(replace)+':'+str(target))
-        # self.do_verbose_print(str(type(target)))
-        if "key" in search and search["key"] != key:
-            return target
-
-        if "regex" in search and search["regex"]:
-            return re.sub(re.compile(search["value"]), replace["value"], target)
-
-        if hasattr(target, "replace"):
-            return target.replace(str(search["value"]), str(replace["value"]))
-
-        # if isinstance(target, (int,long)):
-        if isinstance(target, (int, float)):
-            return replace["value"] if target == search["value"] else target
-
     def backup(self):
         self.do_verbose_print(f'Doing dashboard Backup...')
         if self.args.id is None:
-            print('backup function needs --id with value[s] see --help')
+            print('backup function needs --id with value[s] or all, see --help')
             sys.exit()
+        listing = None
+        if self.args.id.lower() == 'all' or self.args.store:
+            # the store needs modifiedOn to skip unchanged dashboards
+            listing = self._get_dashboard_list()
+        if self.args.id.lower() == 'all':
+            dashboards = listing
+        else:
+            by_id = {str(dashboard['id']): dashboard for dashboard in listing or []}
+            dashboards = [by_id.get(dashboard_id, {'id': dashboard_id}) for dashboard_id in self.args.id.split(',')]
+        self.do_verbose_print(f'Backing up {len(dashboards)} dashboards')
+        if self.args.store:
+            return self._backup_to_store(dashboards)
         if self.args.output is None or self.args.output == 'dashboard_name':
             self.args.output = datetime.now().strftime("%Y_%m_%d-%H_%M_%S")+'.zip'
             self.do_verbose_print(f'Using generated zip filename: {self.args.output}')
-        self.do_verbose_print(self.args.id)
-        # get and split the args cause we will override id in loop
-        dashboard_list = self.args.id.split(',')
-        # get and null output for export loop
-        zip_output = self.args.output
-        self.args.output = None
-        self.do_verbose_print(dashboard_list)
-        with zipfile.ZipFile(zip_output, mode="w") as backup:
-            for dashboard in dashboard_list:
-                # reset id for call below
-                self.args.id = dashboard
-                dashboard_data = self.do_export()
-                dashboard_name = dashboard_data["name"]+".json"
-                backup.writestr(dashboard_name, json.dumps(dashboard_data))
-
-    def duplicate(self):
-        self.do_verbose_print('Doing dashboard Duplication...')
-        self._get_builder_config()
+        errors = []
+        # exports run concurrently, the zip is only written from this thread as they arrive
+        with zipfile.ZipFile(self.args.output, mode="w") as backup:
+            for dashboard, dashboard_data in self.iter_fan_out(lambda d: self._export_dashboard(d['id']),
+                                                               dashboards, errors):
+                backup.writestr(dashboard_data["name"]+".json", json.dumps(dashboard_data))
+        self.report_fan_out_errors(errors, len(dashboards), 'Dashboard export')
+
+    def _backup_to_store(self, dashboards):
+        store = BackupStore(self.args.store)
+        previous = {str(entry['id']): entry for entry in store.read_manifest()['dashboards']}
+        entries = []
+        changed = []
+        for dashboard in dashboards:
+            entry = previous.get(str(dashboard['id']))
+            if entry is not None and dashboard.get('modifiedOn') is not None \
+                    and entry['modifiedOn'] == dashboard['modifiedOn'] and store.has_blob(entry['sha256']):
+                entries.append(dict(entry, name=dashboard.get('name', entry['name'])))
+            else:
+                changed.append(dashboard)
+        self.do_verbose_print(f'{len(entries)} dashboards unchanged since the last backup, exporting {len(changed)}')
+
+        def export_to_store(dashboard):
+            dashboard_data = self._export_dashboard(dashboard['id'])
+            digest, written = store.put(dashboard_data)
+            return {'id': dashboard['id'], 'name': dashboard_data['name'],
+                    'modifiedOn': dashboard.get('modifiedOn'), 'sha256': digest}, written
+
+        errors = []
+        new_blobs = 0
+        for dashboard, (entry, written) in self.iter_fan_out(export_to_store, changed, errors):
+            entries.append(entry)
+            new_blobs += written
+        manifest = store.write_manifest(entries, self.config['CONTROLLER_INFO']['base_url'])
+        print(f'Backup {manifest} in {self.args.store}: {len(entries)} dashboards, {len(changed) - len(errors)} exported, '
+              f'{new_blobs} new blobs')
+        self.report_fan_out_errors(errors, len(changed), 'Dashboard export')
+        return manifest
+
+    def restore(self):
+        self.do_verbose_print('Doing dashboard Restore...')
+        if self.args.input is None and self.args.store is None:
+            print('restore function needs a backup zip with --input or a backup store with --store, see --help')
+            sys.exit()
+        if self.args.store:
+            entries = self._iter_store_entries()
+        else:
+            entries = self._iter_zip_entries()
+        restored = []
+        errors = []
+        restored_bytes = 0
+        start = time.perf_counter()
+
+        def restore_dashboard(entry):
+            # parsed here so a corrupt entry fails only itself
+            dashboard = entry['load']()
+            if self.args.prefix:
+                dashboard['name'] = self.args.prefix + dashboard['name']
+            self._post_dashboard(dashboard, entry['name'] + '.json')
+            return entry['size']
+
+        # entries are read lazily so only the dashboards in flight are held in memory
+        for entry, size in self.iter_fan_out(restore_dashboard, entries, errors):
+            self.do_verbose_print(f'Restored {entry["name"]}')
+            restored.append(entry['name'])
+            restored_bytes += size
+        elapsed = time.perf_counter() - start
+        print(f'Restored {len(restored)} dashboards ({restored_bytes / 1024:.0f} KB) in {elapsed:.2f}s, '
+              f'{len(restored) / elapsed if elapsed else 0:.1f} dashboards/s')
+        self.report_fan_out_errors(errors, len(restored) + len(errors), 'Dashboard restore')
+        return restored
+
+    def _restore_wanted(self, name):
+        return self.args.match is None or fnmatch.fnmatchcase(name, self.args.match)
+
+    def _iter_zip_entries(self):
+        with zipfile.ZipFile(self.args.input) as backup:
+            for info in backup.infolist():
+                name = info.filename[:-len('.json')] if info.filename.endswith('.json') else info.filename
+                if info.is_dir() or not self._restore_wanted(name):
+                    continue
+                try:
+                    with backup.open(info) as entry:
+                        body = entry.read()
+                except (zipfile.BadZipFile, OSError) as err:
+                    # reported by the fan out with the other failed dashboards
+                    yield {'name': name, 'id': info.filename, 'size': info.file_size,
+                           'load': partial(self._raise, err)}
+                    continue
+                yield {'name': name, 'id': info.filename, 'size': info.file_size,
+                       'load': partial(json.loads, body)}
+
+    def _iter_store_entries(self):
+        store = BackupStore(self.args.store)
+        manifest = store.read_manifest(self.args.snapshot)
+        self.do_verbose_print(f'Restoring {len(manifest["dashboards"])} dashboards from {manifest.get("created")}')
+        for entry in manifest['dashboards']:
+            if not self._restore_wanted(entry['name']):
+                continue
+            blob_path = store.blob_path(entry['sha256'])
+            yield {'name': entry['name'], 'id': entry['id'],
+                   'size': os.path.getsize(blob_path) if os.path.exists(blob_path) else 0,
+                   'load': partial(store.get, entry['sha256'])}
+
+    @staticmethod
+    def _raise(err):
+        raise err
+
+    def build_index(self):
+        self.do_verbose_print('Doing dashboard Index...')
+        index = DashboardIndex(self.args.index)
+        indexed = index.indexed()
+        if self.args.store:
+            # index a backup store run, a dashboard is unchanged when its blob is
+            store = BackupStore(self.args.store)
+            listing = store.read_manifest(self.args.snapshot)['dashboards']
+            changed = [d for d in listing if indexed.get(d['id'], (None, None))[1] != d['sha256']]
+
+            def load_dashboard(dashboard):
+                return store.get(dashboard['sha256'])
+        else:
+            listing = self._get_dashboard_list()
+            changed = [d for d in listing if indexed.get(d['id'], (None, None))[0] != d.get('modifiedOn')]
+
+            def load_dashboard(dashboard):
+                return self._export_dashboard(dashboard['id'])
+
+        removed = set(indexed) - {d['id'] for d in listing}
+        index.remove(removed)
+        self.do_verbose_print(f'{len(listing) - len(changed)} dashboards unchanged, indexing {len(changed)}')
+        errors = []
+        # exports run concurrently, sqlite is only written from this thread
+        for dashboard, dashboard_data in self.iter_fan_out(load_dashboard, changed, errors):
+            index.update(dashboard['id'], dashboard_data, dashboard.get('modifiedOn'), dashboard.get('sha256'))
+        index.commit()
+        print(f'Indexed {len(changed) - len(errors)} dashboards, removed {len(removed)}, '
+              f'{len(listing) - len(changed)} unchanged in {self.args.index}')
+        self.report_fan_out_errors(errors, len(changed), 'Dashboard index')
+
+    def query_index(self):
+        if self.args.ref is None:
+            print('query function needs --ref with a value or glob, see --help')
+            sys.exit()
+        matches = DashboardIndex(self.args.index).query(self.args.ref_type, self.args.ref)
+        if self.args.output:
+            with open(self.args.output, "w") as outfile:
+                self.do_verbose_print(f'Saving query results to {self.args.output}')
+                outfile.write(json.dumps(matches))
+        else:
+            for match in matches:
+                print(f'{match["id"]}\t{match["name"]}\t{match["ref_type"]}\t{match["value"]}\t{match["count"]}')
+        return matches
+
+    def diff(self):
+        self.do_verbose_print('Doing dashboard Diff...')
+        sources = (self.args.input or '').split(',')
+        if len(sources) != 2:
+            print('diff function needs --input old,new where each is a json file, a dashboard id, a backup zip '
+                  'or a backup store directory (store@snapshot), see --help')
+            sys.exit()
+        # backup zips stay open while their entries are loaded and are closed after the diff
+        with contextlib.ExitStack() as open_files:
+            old, new = [self._load_diff_source(source, open_files) for source in sources]
+            if isinstance(old, dict) and isinstance(new, dict):
+                changes = diff_dashboards(old, new)
+            elif isinstance(old, list) and isinstance(new, list):
+                changes = self._diff_dashboard_sets(old, new)
+            else:
+                print('diff function compares two dashboards or two backups, not one of each, see --help')
+                sys.exit()
+        if self.args.output:
+            with open(self.args.output, "w") as outfile:
+                self.do_verbose_print(f'Saving diff to {self.args.output}')
+                outfile.write(json.dumps(changes))
+        else:
+            for change in changes:
+                print(self._format_change(change))
+            print(f'{len(changes)} changes')
+        return changes
+
+    def _load_diff_source(self, source, open_files):
+        # a dashboard dict, or a backup as a list of (name, digest or None, loader)
+        if source.isdigit():
+            try:
+                return self._export_dashboard(source)
+            except (requests.exceptions.HTTPError, KeyError) as err:
+                raise SystemExit(f'Dashboard api export of {source} failed: {err}')
+        store_path, _, snapshot = source.partition('@')
+        if not os.path.exists(store_path):
+            print(f'diff input {store_path} does not exist, see --help')
+            sys.exit()
+        if source.endswith('.zip'):
+            backup = open_files.enter_context(zipfile.ZipFile(source))
+            # equal crc and size means an unchanged entry, so it is never read
+            return [(info.filename[:-len('.json')], f'crc:{info.CRC}:{info.file_size}',
+                     lambda info=info: json.loads(backup.read(info)))
+                    for info in backup.infolist() if info.filename.endswith('.json')]
+        if os.path.isdir(store_path):
+            # BackupStore creates missing store directories, a diff must only read an existing store
+            if not os.path.isdir(os.path.join(store_path, 'manifests')):
+                print(f'diff input {store_path} is not a backup store, see --help')
+                sys.exit()
+            store = BackupStore(store_path)
+            return [(entry['name'], f'sha256:{entry["sha256"]}', lambda digest=entry['sha256']: store.get(digest))
+                    for entry in store.read_manifest(snapshot or None)['dashboards']]
+        with open(source, "r") as infile:
+            return json.load(infile)
+
+    def _diff_dashboard_sets(self, old_set, new_set):
+        old_by_name = {name: (digest, loader) for name, digest, loader in old_set}
+        new_by_name = {name: (digest, loader) for name, digest, loader in new_set}
+        changes = []
+        for name in sorted(set(old_by_name) | set(new_by_name)):
+            if name not in new_by_name:
+                changes.append({'dashboard': name, 'widget': None, 'path': '', 'change': 'removed'})
+                continue
+            if name not in old_by_name:
+                changes.append({'dashboard': name, 'widget': None, 'path': '', 'change': 'added'})
+                continue
+            (old_digest, old_loader), (new_digest, new_loader) = old_by_name[name], new_by_name[name]
+            if old_digest == new_digest:
+                continue
+            for change in diff_dashboards(old_loader(), new_loader()):
+                changes.append(dict(change, dashboard=name))
+        return changes
+
+    @staticmethod
+    def _format_change(change):
+        def short(value):
+            text = json.dumps(value)
+            return text if len(text) <= 60 else text[:57] + '...'
+        where = ' '.join(filter(None, [change.get('dashboard'), change['widget'], change['path']]))
+        if change['change'] == 'changed':
+            return f'~ {where}: {short(change["old"])} -> {short(change["new"])}'
+        if change['change'] == 'added':
+            return f'+ {where}' + (f': {short(change["new"])}' if 'new' in change else '')
+        return f'- {where}' + (f': {short(change["old"])}' if 'old' in change else '')
+
+    def _confirm_extend_widgets(self):
         # we are wrapping builder with specific functions so lets guide config as such
         extend_widgets = self._get_option("extendWidgets", False)
         if extend_widgets:
@@ -363,21 +615,33 @@ class Dashboards(ApiBase):
             answer = input('Do you want to change it? [yes|no]')
             if 'yes' in answer.lower():
                 self._set_option("extendWidgets", False)
+
+    def _get_source_dashboard(self):
         source_dash = None
         if self.args.input:
             self.do_verbose_print('--input specified so using that, see --help')
             source_dash = json.loads(open(self.args.input, "r").read())
-        else:
+        elif self.args.id:
             self.do_verbose_print('--id specified so calling export, see --help')
             source_dash = self.do_export()
         if source_dash is None:
             print('--id or --input was not specified so exiting, see --help')
             sys.exit()
+        return source_dash
+
+    def _dump_dashboard(self, dashboard):
+        return json.dumps(dashboard, sort_keys=self.args.prettify, indent=4 if self.args.prettify else None)
+
+    def duplicate(self):
+        self.do_verbose_print('Doing dashboard Duplication...')
+        self._get_builder_config()
+        self._confirm_extend_widgets()
+        source_dash = self._get_source_dashboard()
         result_dash = self._repeat_dashboard(source_dash)
         if self.args.name:
             self.do_verbose_print(f'--name specified so setting new dashboard name to {self.args.name}...')
             result_dash["name"] = self.args.name
-        result = json.dumps(result_dash, sort_keys=self.args.prettify, indent=4 if self.args.prettify else None)
+        result = self._dump_dashboard(result_dash)
 
         if self.args.output is not None:
             try:
@@ -393,3 +657,10 @@ class Dashboards(ApiBase):
                 outfile.write(result)
         else:
             self.do_import(result_dash)
+
+
+def render_dashboard(source_dash, builder_config, verbose=False):
+    # module level so multi_dupe can run it in worker processes
+    dash = Dashboards(None, argparse.Namespace(verbose=verbose))
+    dash.builder_config = builder_config
+    return dash._repeat_dashboard(source_dash)
@@ -2,7 +2,6 @@ import datetime
 import json
 import sys
 
-from cryptography.fernet import Fernet
 import requests
 import logging
 import argparse
@@ -32,6 +31,7 @@ class Events(ApiBase):
         class_commands.add_argument('--name', help='Event Schema name')
         class_commands.add_argument('--id', help='Health Rule id or Suppression id')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -70,7 +70,7 @@ class Events(ApiBase):
 
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.get(url, headers=headers)
+            response = self.do_request('GET', url, headers=headers)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Custom Event Schema get call returned HTTPError: {err}')
@@ -97,7 +97,7 @@ class Events(ApiBase):
         url = f'{self.config[self.CONTROLLER_SECTION]["events_url"]}events/schema/{self.args.name}'
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.delete(url, headers=headers)
+            response = self.do_request('DELETE', url, headers=headers)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Custom Event Schema create call returned HTTPError: {err}')
@@ -123,7 +123,7 @@ class Events(ApiBase):
         self.do_verbose_print(f'Custom Schema: {custom_schema}')
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.patch(url, headers=headers, json=custom_schema)
+            response = self.do_request('PATCH', url, headers=headers, json=custom_schema)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Custom Event Schema create call returned HTTPError: {err}')
@@ -149,7 +149,7 @@ class Events(ApiBase):
         self.do_verbose_print(f'Custom Schema: {custom_schema}')
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.post(url, headers=headers, json=custom_schema)
+            response = self.do_request('POST', url, headers=headers, json=custom_schema)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Custom Event Schema create call returned HTTPError: {err}')
@@ -175,7 +175,7 @@ class Events(ApiBase):
         self.do_verbose_print(f'Event Data: {event_data}')
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.post(url, headers=headers, json=event_data)
+            response = self.do_request('POST', url, headers=headers, json=event_data)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Custom Event Schema create call returned HTTPError: {err}')
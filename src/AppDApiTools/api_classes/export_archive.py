@@ -0,0 +1,49 @@
+import gzip
+import json
+import os
+
+
+class ExportArchive:
+    """Gzipped ndjson archive written one record at a time, with a progress file to resume from.
+
+    Each record is its own gzip member, which gzip readers decompress as one stream. After a
+    member is on disk its key and the archive size are appended to <path>.progress, so a run that
+    was interrupted is resumed by cutting the archive back to the last recorded size and skipping
+    the recorded keys. The progress file is removed once a run completes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.progress_path = path + '.progress'
+        self.done = set()
+        offset = 0
+        if os.path.exists(self.progress_path) and os.path.exists(path):
+            with open(self.progress_path, 'r') as infile:
+                for line in infile:
+                    try:
+                        key, size = json.loads(line)
+                    except ValueError:
+                        # a line cut short by the interruption
+                        break
+                    self.done.add(key)
+                    offset = size
+        self.resumed = bool(self.done)
+        self.archive = open(path, 'r+b' if self.resumed else 'wb')
+        self.archive.truncate(offset)
+        self.archive.seek(offset)
+        self.progress = open(self.progress_path, 'a' if self.resumed else 'w')
+
+    def write(self, key, record):
+        self.archive.write(gzip.compress((json.dumps(record) + '\n').encode('UTF-8')))
+        self.archive.flush()
+        os.fsync(self.archive.fileno())
+        self.progress.write(json.dumps([key, self.archive.tell()]) + '\n')
+        self.progress.flush()
+        self.done.add(key)
+
+    def close(self, complete=True):
+        self.archive.close()
+        self.progress.close()
+        if complete:
+            os.remove(self.progress_path)
+
@@ -1,13 +1,20 @@
+import collections
 import datetime
+import fnmatch
+import hashlib
 import json
+import re
 import sys
+import time
 
-from cryptography.fernet import Fernet
 import requests
 import logging
 import argparse
 from .api_base import ApiBase
 from .applications import Applications
+from .export_archive import ExportArchive
+from .rule_drift import RuleHashStore, RULE_DRIFT_FILE, RULE_DRIFT_TTL, group_variants, summary_hash
+from .suppression_plan import load_plan, build_suppression, is_expired
 
 
 class Healthrules(ApiBase):
@@ -23,8 +30,11 @@ class Healthrules(ApiBase):
             'suppression_list',
             'suppression_get',
             'suppression_create',
+            'suppression_schedule',
             'search',
-            'sync_rule'
+            'sync_rule',
+            'export_all',
+            'drift'
         ]
         class_commands = subparser.add_parser('Healthrules', help='Healthrules commands')
         class_commands.add_argument('function', choices=functions, help='The Healthrules api function to run')
@@ -33,13 +43,25 @@ class Healthrules(ApiBase):
         class_commands.add_argument('--input', help='The input template created with the AppDynamics UI')
         class_commands.add_argument('--output', help='The output file.', nargs='?', const='dashboard_name')
         class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
-        class_commands.add_argument('--name', help='Health Rule name or Suppression name')
-        class_commands.add_argument('--id', help='Health Rule id or Suppression id')
+        class_commands.add_argument('--name', help='Health Rule name or Suppression name, get and delete take a comma list, suppression_get also takes globs')
+        class_commands.add_argument('--id', help='Health Rule id or Suppression id, get and delete take a comma list')
         class_commands.add_argument('--start', help='Suppression start time 24HR format (YYYY-MM-DD HH:MM:SS)')
         class_commands.add_argument('--duration', help='Suppression duration in minutes')
         class_commands.add_argument('--rule_list', help='Suppression rule names as quoted comma delimited list')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
         class_commands.add_argument('--timezone', help='Suppression rule timezone string')
+        class_commands.add_argument('--regex', help='Search health rule names with this regular expression')
+        class_commands.add_argument('--enabled', help='Search only enabled or disabled health rules', choices=['true', 'false'])
+        class_commands.add_argument('--entity_type', help='Search health rules by affected entity type, e.g. BUSINESS_TRANSACTION_PERFORMANCE')
+        class_commands.add_argument('--dry_run', '--dry-run', help='Show the sync_rule or suppression_schedule plan without applying it',
+                                    action='store_true')
+        class_commands.add_argument('--delete_expired', '--delete-expired', help='suppression_schedule also deletes ended one time suppressions of the plan apps',
+                                    action='store_true')
+        class_commands.add_argument('--db', help='drift keeps the rule hashes of the last run here', default=RULE_DRIFT_FILE)
+        class_commands.add_argument('--workers', help='Number of applications to call concurrently', type=int, default=4)
+        cls.add_format_arguments(class_commands)
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -56,61 +78,50 @@ class Healthrules(ApiBase):
             app.delete_rule()
         if args.function == 'sync_rule':
             app.sync_health_rule()
+        if args.function == 'export_all':
+            app.export_all()
+        if args.function == 'drift':
+            app.drift_report()
         if args.function == 'suppression_list':
             app.get_action_suppression_list()
         if args.function == 'suppression_get':
             app.get_action_suppression()
         if args.function == 'suppression_create':
             app.create_action_suppression()
+        if args.function == 'suppression_schedule':
+            app.schedule_action_suppressions()
         if args.function == 'search':
             app.search()
 
-    def _get_app_data(self):
-        newargs = argparse.Namespace(subparser_name='Applications',
-                                     function='get',
-                                     id=None,
-                                     name=None,
-                                     verbose=self.args.verbose,
-                                     auth=self.args.auth,
-                                     output=None,
-                                     system=self.args.system)
-        app = Applications(self.config, newargs)
-        app.set_config_prefixes()
-        app.set_app_arg(self.args.application)
-        app_data = app.get_app()
-        return app_data
+    def _get_app_action_list(self, app_data, ids=None, names=None):
+        # one listing per app, the wanted suppressions are picked with an id set, a name set and
+        # the name globs, returns (app, suppression) pairs
+        id_list = ids.split(',') if ids is not None else []
+        if not all(suppression_id.strip().isdigit() for suppression_id in id_list):
+            print(f'Action suppression --id must be numeric ids, got {ids}, see --help')
+            sys.exit()
+        id_set = {int(suppression_id) for suppression_id in id_list}
+        name_list = names.split(',') if names is not None else []
+        name_set = {name for name in name_list if not any(c in name for c in '*?[')}
+        name_globs = [name for name in name_list if name not in name_set]
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
 
-    def _get_app_action_list(self, ids=None, names=None):
-        output_tmp = self.args.output
-        self.args.output = None
-        alist = self.get_action_suppression_list()
-        self.do_verbose_print(f'Get Suppression id {alist}')
-        self.args.output = output_tmp
-        # TODO this below still doesn't work right with multiple apps
-        filtered_list = []
-        id_list = []
-        if ids is not None:
-            id_list = ids.split(',')
-        name_list = []
-        if names is not None:
-            name_list = names.split(',')
-        #print(id_list)
-        #print(name_list)
-        for app in alist:
-            #print(app)
-            filtered_actions = []
-            for action_suppression in app['action_suppressions']:
-                for id in id_list:
-                    if id == action_suppression['id']:
-                        filtered_actions.append(action_suppression)
-                for name in name_list:
-                    if name == action_suppression['name']:
-                        filtered_actions.append(action_suppression)
-            if len(filtered_actions) > 0:
-                app_copy = app
-                app_copy['action_suppressions'] = filtered_actions
-                filtered_list.append(app_copy)
-        return filtered_list
+        def wanted(suppression):
+            return suppression['id'] in id_set or suppression['name'] in name_set or \
+                any(fnmatch.fnmatchcase(suppression['name'], glob) for glob in name_globs)
+
+        def find_app_suppressions(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions?output=JSON'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            return [(app, suppression) for suppression in response.json() if wanted(suppression)]
+
+        suppression_pairs = [pair for pairs in self.fan_out(find_app_suppressions, app_data, 'Action Suppression list')
+                             for pair in pairs]
+        self.do_verbose_print(f'Found {len(suppression_pairs)} suppressions for ids {ids} names {names} '
+                              f'in {len(app_data)} apps')
+        return suppression_pairs
 
     def sync_health_rule(self):
         self.set_request_logging()
@@ -122,26 +133,205 @@ class Healthrules(ApiBase):
             self.do_verbose_print('No applications specified, assuming all')
             self.args.application = 'all'
         health_rule = json.loads(open(self.args.input, "r").read())
-        self.args.name = health_rule["name"]
-        self.do_verbose_print(f'Searching for rules named: {self.args.name}')
-        output_temp = self.args.output
-        self.args.output = None
-        health_list = self.search()
-        self.do_verbose_print(f'The search list of all apps: {health_list}')
-        created_list = []
-        for app in health_list:
-            # for sync we depend on search of all apps giving us empty rule list when name not found
-            if len(app['health_rules']) > 0:
+        rule_name = health_rule["name"]
+        template_hash = self._rule_hash(health_rule)
+        self.do_verbose_print(f'Planning sync of rule {rule_name} ({template_hash[:12]})')
+        app_data = self._get_app_data()
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def plan_app(app):
+            # create when the app has no rule by this name, update when its detail differs from the template
+            app = {'id': app['id'], 'name': app['name']}
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules?output=JSON'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            existing = [rule for rule in response.json() if rule['name'] == rule_name]
+            if not existing:
+                return {'application': app, 'action': 'create', 'rule_id': None}
+            rule_id = existing[0]['id']
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules/{rule_id}'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            action = 'unchanged' if self._rule_hash(response.json()) == template_hash else 'update'
+            return {'application': app, 'action': action, 'rule_id': rule_id}
+
+        plan = self.fan_out(plan_app, app_data, 'Health Rule sync plan')
+        for step in plan:
+            rule = f' (rule {step["rule_id"]})' if step['rule_id'] is not None else ''
+            print(f'{step["action"]:<9} {step["application"]["name"]}{rule}')
+        counts = {action: sum(1 for step in plan if step['action'] == action)
+                  for action in ('create', 'update', 'unchanged')}
+        print(f'{counts["create"]} to create, {counts["update"]} to update, {counts["unchanged"]} unchanged')
+        if not self.args.dry_run:
+            self._apply_sync_plan(plan, health_rule)
+        if self.args.output:
+            self.write_output(plan)
+        return plan
+
+    @staticmethod
+    def _normalize_rule(rule):
+        # ids are assigned by the controller and unset values are left out of exports
+        if isinstance(rule, dict):
+            return {key: Healthrules._normalize_rule(value) for key, value in rule.items()
+                    if key != 'id' and value is not None}
+        if isinstance(rule, list):
+            return [Healthrules._normalize_rule(value) for value in rule]
+        return rule
+
+    def _rule_hash(self, rule):
+        normalized = json.dumps(self._normalize_rule(rule), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(normalized.encode('UTF-8')).hexdigest()
+
+    def _apply_sync_plan(self, plan, health_rule):
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def apply_step(step):
+            app = step['application']
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules'
+            if step['action'] == 'create':
+                response = self.do_request('POST', base_url + url, auth=auth, headers=headers, json=health_rule)
+            else:
+                # PUT <controller_url>/controller/alerting/rest/v1/applications/<application_id>/health-rules/{health-rule-id}
+                response = self.do_request('PUT', base_url + url + f'/{step["rule_id"]}', auth=auth, headers=headers,
+                                           json=dict(health_rule, id=step['rule_id']))
+            response.raise_for_status()
+            step['result'] = response.json()
+            self.do_verbose_print(f'Health Rule {step["action"]} done for {app["name"]}')
+            return step
+
+        changes = [step for step in plan if step['action'] != 'unchanged']
+        applied = self.fan_out(apply_step, changes, 'Health Rule sync')
+        print(f'Applied {len(applied)} of {len(changes)} changes')
+
+    def export_all(self):
+        # every health rule definition of every app into a resumable gzipped ndjson archive, see export_archive.py
+        self.set_request_logging()
+        self.do_verbose_print('Doing Health Rule Export All...')
+        if self.args.output is None:
+            print('No archive file specified with --output, see --help')
+            sys.exit()
+        if self.args.application is None:
+            self.args.application = 'all'
+        app_data = self._get_app_data()
+        archive = ExportArchive(self.args.output)
+        todo = [app for app in app_data if app['id'] not in archive.done]
+        if archive.resumed:
+            print(f'Resuming {self.args.output}, {len(app_data) - len(todo)} of {len(app_data)} apps already exported')
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def export_app(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules'
+            response = self.do_request('GET', base_url + url + '?output=JSON', auth=auth, headers=headers)
+            response.raise_for_status()
+            rules = []
+            for rule in response.json():
+                response = self.do_request('GET', base_url + url + f'/{rule["id"]}', auth=auth, headers=headers)
+                response.raise_for_status()
+                rules.append(response.json())
+            return dict(app, health_rules=rules)
+
+        errors = []
+        rule_count = 0
+        finished = False
+        try:
+            # each app is written and checkpointed as soon as its rules are in
+            for app, record in self.iter_fan_out(export_app, todo, errors):
+                archive.write(app['id'], record)
+                rule_count += len(record['health_rules'])
+                self.do_verbose_print(f'Exported {len(record["health_rules"])} rules of {app["name"]}')
+            finished = True
+        finally:
+            # an interrupted or partly failed run keeps its progress file for the next run
+            archive.close(complete=finished and not errors)
+        self.report_fan_out_errors(errors, len(todo), 'Health Rule export')
+        print(f'Exported {rule_count} rules of {len(todo) - len(errors)} apps to {self.args.output}')
+        if errors:
+            print(f'{len(errors)} apps failed, run export_all again to resume them')
+
+    def drift_report(self):
+        # which apps' copies of one health rule differ from the most common version of it
+        self.set_request_logging()
+        self.do_verbose_print('Doing Health Rule Drift...')
+        if self.args.name is None:
+            print('No health rule name specified with --name, see --help')
+            sys.exit()
+        if self.args.application is None:
+            self.args.application = 'all'
+        rule_name = self.args.name
+        app_data = self._get_app_data()
+        store = RuleHashStore(self.args.db)
+        stored = store.load(rule_name)
+        ttl = int(self.config[self.CONTROLLER_SECTION].get('cache_ttl_rule_drift', RULE_DRIFT_TTL))
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def check_app(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules'
+            response = self.do_request('GET', base_url + url + '?output=JSON', auth=auth, headers=headers)
+            response.raise_for_status()
+            summary = next((rule for rule in response.json() if rule['name'] == rule_name), None)
+            if summary is None:
+                return None
+            digest = summary_hash(summary)
+            previous = stored.get(app['id'])
+            # the details are only fetched again when the summary changed or the stored hash is old
+            if previous is not None and not self.args.refresh and previous['rule_id'] == summary['id'] and \
+                    previous['summary_hash'] == digest and previous['checked'] + ttl > time.time():
+                return dict(previous, fetched=False)
+            response = self.do_request('GET', base_url + url + f'/{summary["id"]}', auth=auth, headers=headers)
+            response.raise_for_status()
+            rule = self._normalize_rule(response.json())
+            return {'rule_id': summary['id'], 'summary_hash': digest, 'rule_hash': self._rule_hash(rule), 'rule': rule,
+                    'fetched': True}
+
+        errors = []
+        app_hashes = []
+        rules = {}
+        missing = []
+        fetched = 0
+        for app, result in self.iter_fan_out(check_app, app_data, errors):
+            if result is None:
+                missing.append(app['name'])
+                store.remove(rule_name, app['id'])
                 continue
-            # we will run create, output arg is set to none already, input arg is used and we just reset the all apps arg
-            created_list.append(self.create_rule(app_data=[app]))
-        self.args.output = output_temp
+            if result['fetched']:
+                fetched += 1
+                store.put(rule_name, app['id'], result['rule_id'], result['summary_hash'], result['rule_hash'],
+                          result['rule'])
+            app_hashes.append((app, result['rule_hash']))
+            rules.setdefault(result['rule_hash'], result['rule'])
+        store.commit()
+        self.report_fan_out_errors(errors, len(app_data), 'Health Rule drift')
+        self.do_verbose_print(f'Fetched {fetched} rule details, reused {len(app_hashes) - fetched} stored hashes')
+
+        variants = group_variants(app_hashes, rules)
+        print(f'"{rule_name}" in {len(app_hashes)} of {len(app_data)} apps, {len(variants)} variants')
+        for number, variant in enumerate(variants, start=1):
+            label = 'most common' if number == 1 else f'{len(variant["changes"])} fields differ'
+            print(f'variant {number} ({label}) in {variant["count"]} apps: {", ".join(variant["applications"])}')
+            for change in variant['changes']:
+                print('    ' + self._format_drift_change(change))
+        if missing:
+            print(f'missing in {len(missing)} apps: {", ".join(missing)}')
+        report = {'name': rule_name, 'variants': variants, 'missing': missing,
+                  'most_common': rules[variants[0]['hash']] if variants else None}
         if self.args.output:
-            json_obj = json.dumps(created_list)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return created_list
+            self.write_output(report)
+        return report
+
+    @staticmethod
+    def _format_drift_change(change):
+        def short(value):
+            text = json.dumps(value)
+            return text if len(text) <= 60 else text[:57] + '...'
+        if change['change'] == 'changed':
+            return f'~ {change["path"]}: {short(change["old"])} -> {short(change["new"])}'
+        if change['change'] == 'added':
+            return f'+ {change["path"]}: {short(change["new"])}'
+        return f'- {change["path"]}: {short(change["old"])}'
 
     def delete_rule(self, app_data=None):
         self.set_request_logging()
@@ -149,35 +339,23 @@ class Healthrules(ApiBase):
         if self.args.application is None and app_data is None:
             print('No application id or name specified with --application, see --help')
             sys.exit()
+        self._get_wanted_rules()
         if app_data is None:
             app_data = self._get_app_data()
-        if self.args.name is None and self.args.id is None:
-            print('No health rule name specified with --name or id with --id, see --help')
-            sys.exit()
-        rids = []
-        if self.args.id is None:
-            self.do_verbose_print('health rule name given, getting list to get id')
-            rids = self._get_rule_id_with_app(rule_name=self.args.name)
-        else:
-            rids = self._get_rule_id_with_app(rule_id=self.args.id)
-        self.do_verbose_print(f'rule ids by app: {rids}')
+        rule_pairs = self._resolve_rules(app_data)
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         headers, auth = self.set_auth_headers()
         # DELETE <controller_url>/controller/alerting/rest/v1/applications/<application_id>/health-rules/{health-rule-id}
 
-        for app in app_data:
-            if app["id"] not in rids or rids[app["id"]]["id"] is None:
-                continue
-            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules/{rids[app["id"]]["id"]}'
-
-            try:
-                # response = requests.get(url, headers=headers)
-                response = requests.delete(base_url + url, auth=auth, headers=headers)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Health Rule Delete api export call returned HTTPError: {err}')
-            self.do_verbose_print(f'Health Rule: {rids[app["id"]]["id"]} deleted!')
+        def delete_app_rule(pair):
+            app, rule = pair
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules/{rule["id"]}'
+            response = self.do_request('DELETE', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            self.do_verbose_print(f'Health Rule: {rule["id"]} deleted!')
+            return app
 
+        self.fan_out(delete_app_rule, rule_pairs, 'Health Rule Delete')
 
     def create_rule(self, app_data=None):
         self.set_request_logging()
@@ -194,20 +372,17 @@ class Healthrules(ApiBase):
         headers, auth = self.set_auth_headers()
         health_rule = json.loads(open(self.args.input, "r").read())
         # POST <controller_url>/controller/alerting/rest/v1/applications/<application_id>/health-rules
-        health_rule_data = []
-        for app in app_data:
-            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules'
 
-            try:
-                # response = requests.get(url, headers=headers)
-                response = requests.post(base_url + url, auth=auth, headers=headers, json=health_rule)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Health Rule create call returned HTTPError: {err}')
+        def create_app_rule(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules'
+            response = self.do_request('POST', base_url + url, auth=auth, headers=headers, json=health_rule)
+            response.raise_for_status()
             app_copy = app
             app_copy['health_rule_details'] = [response.json()]
-            health_rule_data.append(app_copy)
             self.do_verbose_print(json.dumps(app_copy)[0:200] + '...')
+            return app_copy
+
+        health_rule_data = self.fan_out(create_app_rule, app_data, 'Health Rule create')
         if self.args.output:
             json_obj = json.dumps(health_rule_data)
             with open(self.args.output, "w") as outfile:
@@ -221,28 +396,34 @@ class Healthrules(ApiBase):
         if self.args.application is None:
             print('No application id or name specified with --application, see --help')
             sys.exit()
-        if self.args.name is None:
-            print('No health rule name specified with --name, see --help')
+        rule_filter = self._get_rule_filter()
+        if rule_filter is None:
+            print('No health rule search specified with --name, --regex, --enabled or --entity_type, see --help')
             sys.exit()
-        output_tmp = self.args.output
-        self.args.output = None
-        health_list = self.get_health_list()
-        self.args.output = output_tmp
-        # simplicity of getting done lets just loop and remove from whole list
-
-        for app in health_list:
-            match_rule_list = []
-            for rule in app["health_rules"]:
-                if self.args.name.lower() in rule['name'].lower():
-                    match_rule_list.append(rule)
-            app["health_rules"] = match_rule_list
-
-        if self.args.output:
-            json_obj = json.dumps(health_list)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return health_list
+        # filter each app's rules as it arrives so only the matches are ever held
+        return self.get_health_list(rule_filter=rule_filter)
+
+    def _get_rule_filter(self):
+        # every given predicate has to match, None when there are none
+        predicates = []
+        if self.args.name is not None:
+            search_name = self.args.name.lower()
+            predicates.append(lambda rule: search_name in rule['name'].lower())
+        if getattr(self.args, 'regex', None) is not None:
+            try:
+                name_regex = re.compile(self.args.regex)
+            except re.error as err:
+                raise SystemExit(f'Invalid --regex {self.args.regex}: {err}')
+            predicates.append(lambda rule: name_regex.search(rule['name']) is not None)
+        if getattr(self.args, 'enabled', None) is not None:
+            enabled = self.args.enabled == 'true'
+            predicates.append(lambda rule: rule.get('enabled') == enabled)
+        if getattr(self.args, 'entity_type', None) is not None:
+            entity_type = self.args.entity_type.upper()
+            predicates.append(lambda rule: str(rule.get('affectedEntityType', '')).upper() == entity_type)
+        if not predicates:
+            return None
+        return lambda rule: all(predicate(rule) for predicate in predicates)
 
     def create_action_suppression(self):
         # TODO database action suppressions - no api for databases
@@ -289,20 +470,17 @@ class Healthrules(ApiBase):
 
             self.do_verbose_print(f'Built suppresion create json: {action_suppression}')
         headers, auth = self.set_auth_headers()
-        action_suppression_data = []
-        for app in app_data:
-            url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions'
 
-            try:
-                # response = requests.get(url, headers=headers)
-                response = requests.post(base_url + url, auth=auth, headers=headers, json=action_suppression)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Action Suppression create call returned HTTPError: {err}')
+        def create_app_suppression(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions'
+            response = self.do_request('POST', base_url + url, auth=auth, headers=headers, json=action_suppression)
+            response.raise_for_status()
             app_copy = app
             app_copy['action_suppressions'] = [response.json()]
-            action_suppression_data.append(app_copy)
             self.do_verbose_print(json.dumps(app_copy)[0:200] + '...')
+            return app_copy
+
+        action_suppression_data = self.fan_out(create_app_suppression, app_data, 'Action Suppression create')
 
         if self.args.output:
             json_obj = json.dumps(action_suppression_data)
@@ -311,6 +489,131 @@ class Healthrules(ApiBase):
                 outfile.write(json_obj)
         return action_suppression_data
 
+    def schedule_action_suppressions(self):
+        # bulk create from a csv or json plan, see suppression_plan.py for the columns
+        self.set_request_logging()
+        self.do_verbose_print('Doing Action Suppression Schedule...')
+        if self.args.input is None:
+            print('No suppression plan specified with --input, see --help')
+            sys.exit()
+        plan = load_plan(self.args.input)
+        # the whole plan is checked before anything is sent
+        problems = []
+        entries = []
+        app_cache = {}
+        for row_number, row in enumerate(plan, start=1):
+            try:
+                suppression = build_suppression(row, self.args.timezone)
+            except ValueError as err:
+                problems.append(f'row {row_number}: {err}')
+                continue
+            application = str(row['application'])
+            if application not in app_cache:
+                app_cache[application] = self._get_plan_apps(application)
+            if not app_cache[application]:
+                problems.append(f'row {row_number}: no application matches {application}')
+            entries.extend((app, suppression) for app in app_cache[application])
+        if problems:
+            print('\n'.join(problems))
+            print(f'{len(problems)} problems in {self.args.input}, nothing was scheduled')
+            sys.exit()
+        wanted = {}
+        for app, suppression in entries:
+            wanted.setdefault((app['id'], suppression['name']), (app, suppression))
+        duplicates = len(entries) - len(wanted)
+        apps = list({app['id']: app for app, suppression in wanted.values()}.values())
+        existing = self._get_existing_suppressions(apps)
+
+        creates = [(app, suppression) for (app_id, name), (app, suppression) in wanted.items()
+                   if name not in existing[app_id]['keep']]
+        deletes = [(app, suppression) for app in apps for suppression in existing[app['id']]['expired']]
+        print(f'{len(creates)} to create, {len(wanted) - len(creates)} already scheduled, '
+              f'{duplicates} duplicates in plan, {len(deletes)} expired to delete')
+        if self.args.dry_run:
+            for app, suppression in creates:
+                print(f'create    {app["name"]}: {suppression["name"]}')
+            for app, suppression in deletes:
+                print(f'delete    {app["name"]}: {suppression["name"]} (ended {suppression["endTime"]})')
+            return {'create': creates, 'delete': deletes}
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def apply_step(step):
+            action, app, suppression = step
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions'
+            if action == 'create':
+                response = self.do_request('POST', base_url + url, auth=auth, headers=headers, json=suppression)
+            else:
+                # DELETE <controller_url>/controller/alerting/rest/v1/applications/<application_id>/action-suppressions/{action-suppression-id}
+                response = self.do_request('DELETE', base_url + url + f'/{suppression["id"]}', auth=auth, headers=headers)
+            response.raise_for_status()
+            self.do_verbose_print(f'Action Suppression {action} done for {app["name"]}: {suppression["name"]}')
+            return {'action': action, 'application': app,
+                    'action_suppression': response.json() if action == 'create' else suppression}
+
+        # deletes finish first so an ended window can be replaced by a new one of the same name
+        applied = self.fan_out(apply_step, [('delete', app, suppression) for app, suppression in deletes],
+                               'Action Suppression delete')
+        applied += self.fan_out(apply_step, [('create', app, suppression) for app, suppression in creates],
+                                'Action Suppression create')
+        print(f'Applied {len(applied)} of {len(deletes) + len(creates)} changes')
+        if self.args.output:
+            self.write_output(applied)
+        return applied
+
+    def _get_plan_apps(self, application):
+        application_tmp = self.args.application
+        self.args.application = application
+        app_data = self._get_app_data()
+        self.args.application = application_tmp
+        return app_data
+
+    def _get_existing_suppressions(self, apps):
+        # {app id: {'keep': names to dedupe against, 'expired': suppressions to delete}}
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def list_app(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions?output=JSON'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            return response.json()
+
+        existing = {app['id']: {'keep': set(), 'expired': []} for app in apps}
+        errors = []
+        pairs = []
+        for app, suppressions in self.iter_fan_out(list_app, apps, errors):
+            existing[app['id']]['keep'].update(suppression['name'] for suppression in suppressions)
+            pairs.extend((app, suppression) for suppression in suppressions)
+        if errors:
+            # without the current suppressions of an app the plan could create duplicates on it
+            self.report_fan_out_errors(errors, len(apps), 'Action Suppression list')
+            print('Could not list existing suppressions, nothing was scheduled')
+            sys.exit()
+        if self.args.delete_expired:
+            # the list has no schedule, so the details of every existing suppression are needed
+            def get_detail(pair):
+                app, suppression = pair
+                url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions/{suppression["id"]}?output=JSON'
+                response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+                response.raise_for_status()
+                return response.json()
+
+            errors = []
+            expired_ids = set()
+            for (app, suppression), detail in self.iter_fan_out(get_detail, pairs, errors):
+                if is_expired(detail):
+                    expired_ids.add((app['id'], detail['id']))
+                    existing[app['id']]['expired'].append(detail)
+            self.report_fan_out_errors(errors, len(pairs), 'Action Suppression details')
+            # names held only by ended windows are free for the plan again
+            for app in apps:
+                existing[app['id']]['keep'] = set()
+            for app, suppression in pairs:
+                if (app['id'], suppression['id']) not in expired_ids:
+                    existing[app['id']]['keep'].add(suppression['name'])
+        return existing
+
     def get_action_suppression(self):
         # GET <controller_url>/controller/alerting/rest/v1/applications/<application_id>/action-suppressions/{action-suppression-id}
         self.set_request_logging()
@@ -318,38 +621,31 @@ class Healthrules(ApiBase):
         if self.args.application is None:
             print('No application id or name specified with --application, see --help')
             sys.exit()
-        #app_data = self._get_app_data()
-        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         if self.args.name is None and self.args.id is None:
             print('No action suppression name specified with --name or id with --id, see --help')
             sys.exit()
-        app_data = self._get_app_action_list(self.args.id, self.args.name)
+        app_data = self._get_app_data()
+        suppression_pairs = self._get_app_action_list(app_data, self.args.id, self.args.name)
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         headers, auth = self.set_auth_headers()
-        action_suppression_data = []
-        self.do_verbose_print(app_data)
-        for app in app_data:
-            app_actions = []
-            for action in app['action_suppressions']:
-                url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions/{action["id"]}?output=JSON'
-
-                try:
-                    # response = requests.get(url, headers=headers)
-                    response = requests.get(base_url + url, auth=auth, headers=headers)
-                    response.raise_for_status()
-                except requests.exceptions.HTTPError as err:
-                    raise SystemExit(f'Action Suppression details call returned HTTPError: {err}')
-
-                self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
-                app_actions.append(response.json())
-            app_copy = app
-            app_copy['action_suppressions'] = app_actions
-            action_suppression_data.append(app_copy)
 
+        def get_suppression(pair):
+            app, action = pair
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions/{action["id"]}?output=JSON'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
+            return response.json()
+
+        # details of every app are fetched in one fan out, then grouped back per app in list order
+        errors = []
+        app_suppressions = {}
+        for (app, action), detail in self.iter_fan_out(get_suppression, suppression_pairs, errors):
+            app_suppressions.setdefault(app['id'], dict(app, action_suppressions=[]))['action_suppressions'].append(detail)
+        self.report_fan_out_errors(errors, len(suppression_pairs), 'Action Suppression details')
+        action_suppression_data = list(app_suppressions.values())
         if self.args.output:
-            json_obj = json.dumps(action_suppression_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(action_suppression_data)
         return action_suppression_data
 
     def get_action_suppression_list(self):
@@ -362,27 +658,18 @@ class Healthrules(ApiBase):
         app_data = self._get_app_data()
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         headers, auth = self.set_auth_headers()
-        action_suppression_data = []
-        for app in app_data:
+
+        def get_app_suppression_list(app):
             url = f'controller/alerting/rest/v1/applications/{app["id"]}/action-suppressions?output=JSON'
-            try:
-                # response = requests.get(url, headers=headers)
-                response = requests.get(base_url + url, auth=auth, headers=headers)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Action Suppression list call returned HTTPError: {err}')
-            self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
-            app['action_suppressions'] = response.json()
-            action_suppression_data.append(app)
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            app = dict(app, action_suppressions=response.json())
+            self.do_verbose_print(json.dumps(app['action_suppressions'])[0:200] + '...')
+            return app
 
-        if self.args.output:
-            json_obj = json.dumps(action_suppression_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return action_suppression_data
+        return self.fan_out_output(get_app_suppression_list, app_data, 'Action Suppression list')
 
-    def get_health_list(self, app_data=None):
+    def get_health_list(self, app_data=None, rule_filter=None):
         # GET <controller_url>/controller/alerting/rest/v1/applications/<application_id>/health-rules
         self.set_request_logging()
         self.do_verbose_print('Doing health rule List...')
@@ -393,41 +680,56 @@ class Healthrules(ApiBase):
             app_data = self._get_app_data()
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         headers, auth = self.set_auth_headers()
-        rule_data = []
-        for app in app_data:
+
+        def get_app_rules(app):
             url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules?output=JSON'
+            response = self.do_request('GET', base_url+url, auth=auth, headers=headers)
+            response.raise_for_status()
+            rules = response.json()
+            if rule_filter is not None:
+                rules = [rule for rule in rules if rule_filter(rule)]
+            app = dict(app, health_rules=rules)
+            self.do_verbose_print(json.dumps(app['health_rules'])[0:200] + '...')
+            return app
+
+        return self.fan_out_output(get_app_rules, app_data, 'Health Rule list')
+
+    def _get_wanted_rules(self):
+        # (index key, wanted values) from --id or --name, --id wins and both take comma lists
+        if self.args.name is None and self.args.id is None:
+            print('No health rule name specified with --name or id with --id, see --help')
+            sys.exit()
+        if self.args.id is not None:
+            rule_ids = [rule_id.strip() for rule_id in str(self.args.id).split(',')]
+            if not all(rule_id.isdigit() for rule_id in rule_ids):
+                print(f'Health rule --id must be numeric ids, got {self.args.id}, see --help')
+                sys.exit()
+            return 'id', [int(rule_id) for rule_id in rule_ids]
+        return 'name', self.args.name.split(',')
 
-            try:
-                #response = requests.get(url, headers=headers)
-                response = requests.get(base_url+url, auth=auth, headers=headers)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Health Rule api export call returned HTTPError: {err}')
-            app['health_rules'] = response.json()
-            rule_data.append(app)
-            self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
-        json_obj = json.dumps(rule_data)
-        if self.args.output:
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return rule_data
-
-    def _get_rule_id_with_app(self, rule_name=None, rule_id=None):
-        output_tmp = self.args.output
-        self.args.output = None
-        rule_list = self.get_health_list()
-        self.args.output = output_tmp
-        rule_ids = {}
-        if rule_id is not None:
-            rule_id = int(rule_id)
-        for app in rule_list:
-            for rule in app['health_rules']:
-                # self.do_verbose_print(f'Searching for rule id: {rule_id}, rule_name: {rule_name} in {rule}')
-                if rule_name == rule["name"] or rule_id == rule['id']:
-                    # self.do_verbose_print(f'Found for rule id: {rule_id}, rule_name: {rule_name} in {rule}')
-                    rule_ids[app['id']] = {'id': rule['id']}
-        return rule_ids
+    def _resolve_rules(self, app_data):
+        # one listing per app, the wanted rules are picked from a name or id index of it
+        index_key, wanted = self._get_wanted_rules()
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def find_app_rules(app):
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules?output=JSON'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            # rule names are not unique within an app, every rule with a wanted name is used
+            index = collections.defaultdict(list)
+            for rule in response.json():
+                index[rule[index_key]].append(rule)
+            duplicates = [key for key in wanted if len(index.get(key, [])) > 1]
+            if duplicates:
+                sys.stderr.write(f'{app["name"]} has several health rules named {", ".join(map(str, duplicates))}, '
+                                 f'all of them are used\n')
+            return [(app, rule) for key in wanted for rule in index.get(key, [])]
+
+        rule_pairs = [pair for pairs in self.fan_out(find_app_rules, app_data, 'Health Rule list') for pair in pairs]
+        self.do_verbose_print(f'Found {len(rule_pairs)} rules for {wanted} in {len(app_data)} apps')
+        return rule_pairs
 
     def get_rule(self):
         # GET <controller_url>/controller/alerting/rest/v1/applications/<application_id>/health-rules/{health-rule-id}
@@ -436,39 +738,21 @@ class Healthrules(ApiBase):
         if self.args.application is None:
             print('No application id or name specified with --application, see --help')
             sys.exit()
+        self._get_wanted_rules()
         app_data = self._get_app_data()
         self.do_verbose_print("Got App Data")
         self.do_verbose_print(app_data)
-        if self.args.name is None and self.args.id is None:
-            print('No health rule name specified with --name or id with --id, see --help')
-            sys.exit()
-        rids = []
-        if self.args.id is None:
-            self.do_verbose_print('health rule name given, getting list to get id')
-            rids = self._get_rule_id_with_app(rule_name=self.args.name)
-        else:
-            rids = self._get_rule_id_with_app(rule_id=self.args.id)
-        self.do_verbose_print(f'rule ids by app: {rids}')
+        rule_pairs = self._resolve_rules(app_data)
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         headers, auth = self.set_auth_headers()
-        rule_data = []
-        for app in app_data:
-            if app["id"] not in rids or rids[app["id"]]["id"] is None:
-                continue
-            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules/{rids[app["id"]]["id"]}'
 
-            try:
-                response = requests.get(base_url+url, auth=auth, headers=headers)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Health Rule api export call returned HTTPError: {err}')
-            app['health_rule_detail'] = response.json()
-            rule_data.append(app)
-            self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
+        def get_app_rule(pair):
+            app, rule = pair
+            url = f'controller/alerting/rest/v1/applications/{app["id"]}/health-rules/{rule["id"]}'
+            response = self.do_request('GET', base_url+url, auth=auth, headers=headers)
+            response.raise_for_status()
+            app = dict(app, health_rule_detail=response.json())
+            self.do_verbose_print(json.dumps(app['health_rule_detail'])[0:200] + '...')
+            return app
 
-        if self.args.output:
-            json_obj = json.dumps(rule_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return rule_data
+        return self.fan_out_output(get_app_rule, rule_pairs, 'Health Rule get')
@@ -0,0 +1,150 @@
+import collections
+import json
+import sys
+
+import requests
+from .api_base import ApiBase
+from .inventory_store import InventoryStore, INVENTORY_FILE
+from .suppression_plan import is_active
+
+
+class Inventory(ApiBase):
+    entity_types = ['application', 'health_rule', 'suppression', 'backend', 'user', 'role']
+
+    @classmethod
+    def get_function_parms(cls, subparser):
+        functions = [
+            'sync',
+            'query'
+        ]
+        class_commands = subparser.add_parser('Inventory', help='Inventory commands')
+        class_commands.add_argument('function', choices=functions, help='The Inventory function to run')
+        class_commands.add_argument('--application', help='Applications id or name to sync (default all) or name glob to query')
+        class_commands.add_argument('--system', help='Specific system prefix config to use')
+        class_commands.add_argument('--output', help='The output file.')
+        class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
+        class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        class_commands.add_argument('--db', help='Inventory database file', default=INVENTORY_FILE)
+        class_commands.add_argument('--type', help='Entity type to query', choices=cls.entity_types)
+        class_commands.add_argument('--name', help='Entity name or glob to query')
+        class_commands.add_argument('--role', help='Query users holding this role name or glob')
+        class_commands.add_argument('--active', help='Query only suppressions active now', action='store_true')
+        class_commands.add_argument('--workers', help='Number of applications to call concurrently', type=int, default=4)
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
+        return class_commands
+
+    @classmethod
+    def run(cls, args, config):
+        inventory = Inventory(config, args)
+        inventory.set_config_prefixes()
+        if args.function == 'sync':
+            inventory.sync()
+        if args.function == 'query':
+            inventory.query()
+
+    def sync(self):
+        self.set_request_logging()
+        self.do_verbose_print('Doing Inventory Sync...')
+        if self.args.application is None:
+            self.args.application = 'all'
+        store = InventoryStore(self.args.db)
+        app_data = self._get_app_data()
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+        totals = collections.defaultdict(collections.Counter)
+
+        def get(url):
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            return response.json()
+
+        # only a sync of all apps can tell an application was deleted, its entities go with it
+        app_rows = [{'key': str(app['id']), 'app_id': app['id'], 'app_name': app['name'], 'name': app['name'],
+                     'data': app} for app in app_data]
+        all_apps = str(self.args.application).upper() == 'ALL'
+        totals['application'].update(store.replace('application', app_rows, prune=all_apps))
+        if all_apps:
+            for entity_type, removed in store.remove_other_apps([app['id'] for app in app_data]).items():
+                totals[entity_type]['removed'] += removed
+
+        def fetch_app(app):
+            app_url = f'controller/alerting/rest/v1/applications/{app["id"]}'
+            rules = get(f'{app_url}/health-rules?output=JSON')
+            # the suppression list has no schedule, the details do
+            suppressions = [get(f'{app_url}/action-suppressions/{suppression["id"]}?output=JSON')
+                            for suppression in get(f'{app_url}/action-suppressions?output=JSON')]
+            backends = get(f'controller/rest/applications/{app["id"]}/backends?output=JSON')
+            return {'health_rule': rules, 'suppression': suppressions, 'backend': backends}
+
+        errors = []
+        # a failed app is skipped whole so its stored entities are not pruned
+        for app, entities in self.iter_fan_out(fetch_app, app_data, errors):
+            for entity_type, items in entities.items():
+                rows = [{'key': f'{app["id"]}:{item["id"]}', 'app_id': app['id'], 'app_name': app['name'],
+                         'name': item.get('name'), 'data': item} for item in items]
+                totals[entity_type].update(store.replace(entity_type, rows, app_id=app['id']))
+            store.commit()
+        app_errors = len(errors)
+        self.report_fan_out_errors(errors, len(app_data), 'Inventory application')
+
+        try:
+            user_list = get('controller/api/rbac/v1/users?output=JSON')['users']
+        except requests.exceptions.HTTPError as err:
+            raise SystemExit(f'Inventory users returned HTTPError: {err}')
+        user_rows = []
+        role_ids = set()
+        user_errors = []
+        for user, detail in self.iter_fan_out(lambda u: get(f'controller/api/rbac/v1/users/{u["id"]}?output=JSON'),
+                                              user_list, user_errors):
+            roles = detail.get('roles') or []
+            role_ids.update(role['id'] for role in roles)
+            user_rows.append({'key': str(detail['id']), 'name': detail.get('name'), 'data': detail,
+                              'links': [('role', role.get('name')) for role in roles]})
+        self.report_fan_out_errors(user_errors, len(user_list), 'Inventory user')
+        role_rows = []
+        role_errors = []
+        for role_id, role in self.iter_fan_out(
+                lambda rid: get(f'controller/api/rbac/v1/roles/{rid}?include-permissions=true'),
+                sorted(role_ids), role_errors):
+            role_rows.append({'key': str(role['id']), 'name': role.get('name'), 'data': role})
+        self.report_fan_out_errors(role_errors, len(role_ids), 'Inventory role')
+        # roles are only known through users, so a failed user also leaves the stored roles alone
+        totals['user'].update(store.replace('user', user_rows, prune=not user_errors))
+        totals['role'].update(store.replace('role', role_rows, prune=not user_errors and not role_errors))
+        store.commit()
+
+        for entity_type in self.entity_types:
+            counts = totals[entity_type]
+            print(f'{entity_type:<12} {counts["added"]:>6} added {counts["updated"]:>6} updated '
+                  f'{counts["unchanged"]:>6} unchanged {counts["removed"]:>6} removed')
+        failed = app_errors + len(user_errors) + len(role_errors)
+        if failed:
+            print(f'{failed} calls failed, their stored entities were kept')
+        return totals
+
+    def query(self):
+        self.do_verbose_print('Doing Inventory Query...')
+        if self.args.type is None:
+            print('No entity type specified with --type, see --help')
+            sys.exit()
+        link_type, link_value = None, None
+        if self.args.role is not None:
+            if self.args.type != 'user':
+                print('--role only applies to --type user, see --help')
+                sys.exit()
+            link_type, link_value = 'role', self.args.role
+        store = InventoryStore(self.args.db)
+        results = store.query(self.args.type, name=self.args.name, app_name=self.args.application,
+                              link_type=link_type, link_value=link_value)
+        if self.args.active:
+            results = [result for result in results if is_active(result['data'])]
+        if self.args.output:
+            with open(self.args.output, "w") as outfile:
+                self.do_verbose_print(f'Saving query results to {self.args.output}')
+                outfile.write(json.dumps(results))
+        else:
+            for result in results:
+                print(f'{result["application"] or "":<30} {result["name"]}')
+            print(f'{len(results)} {self.args.type} entities')
+        return results
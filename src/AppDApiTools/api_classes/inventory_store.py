@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+INVENTORY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                              'inventory.db')
+
+
+def _match(pattern):
+    # glob when the pattern has wildcards, otherwise an exact (indexed) match
+    return 'GLOB' if any(c in pattern for c in '*?[') else '='
+
+
+class InventoryStore:
+    """Local sqlite copy of controller configuration, one row per entity plus searchable links.
+
+    Each row keeps a sha256 of its json so a sync only writes entities whose content changed.
+    """
+
+    def __init__(self, path=INVENTORY_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS inventory (
+                            entity_type TEXT, entity_key TEXT, app_id INTEGER, app_name TEXT, name TEXT,
+                            hash TEXT, data TEXT, synced REAL, PRIMARY KEY (entity_type, entity_key)) WITHOUT ROWID''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS inventory_name ON inventory (entity_type, name)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS inventory_app ON inventory (entity_type, app_id)')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS inventory_links (
+                            entity_type TEXT, entity_key TEXT, link_type TEXT, link_value TEXT)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS inventory_links_value ON inventory_links (link_type, link_value)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS inventory_links_entity ON inventory_links (entity_type, entity_key)')
+        self.db.commit()
+
+    def replace(self, entity_type, rows, app_id=None, prune=True):
+        """Make the stored entities of a type (within one app when app_id is given) match rows.
+
+        rows are dicts of key, name, data and optionally app_id, app_name and links [(type, value)],
+        returns counts of added, updated, unchanged and removed entities.
+        """
+        sql = 'SELECT entity_key, hash FROM inventory WHERE entity_type = ?'
+        params = [entity_type]
+        if app_id is not None:
+            sql += ' AND app_id = ?'
+            params.append(app_id)
+        existing = dict(self.db.execute(sql, params).fetchall())
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+        now = time.time()
+        for row in rows:
+            data = json.dumps(row['data'], sort_keys=True, separators=(',', ':'))
+            digest = hashlib.sha256(data.encode('UTF-8')).hexdigest()
+            old_digest = existing.pop(row['key'], None)
+            if old_digest == digest:
+                counts['unchanged'] += 1
+                continue
+            counts['added' if old_digest is None else 'updated'] += 1
+            self.db.execute('INSERT OR REPLACE INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (entity_type, row['key'], row.get('app_id'), row.get('app_name'), row['name'], digest,
+                             data, now))
+            self.db.execute('DELETE FROM inventory_links WHERE entity_type = ? AND entity_key = ?',
+                            (entity_type, row['key']))
+            self.db.executemany('INSERT INTO inventory_links VALUES (?, ?, ?, ?)',
+                                [(entity_type, row['key'], link_type, link_value)
+                                 for link_type, link_value in row.get('links', [])])
+        if prune:
+            for key in existing:
+                self.db.execute('DELETE FROM inventory WHERE entity_type = ? AND entity_key = ?', (entity_type, key))
+                self.db.execute('DELETE FROM inventory_links WHERE entity_type = ? AND entity_key = ?',
+                                (entity_type, key))
+            counts['removed'] = len(existing)
+        return counts
+
+    def remove_other_apps(self, app_ids):
+        """Drop the entities of every application not in app_ids, returns removed counts per entity type."""
+        app_ids = set(app_ids)
+        stale = [(entity_type, entity_key) for entity_type, entity_key, app_id in
+                 self.db.execute("SELECT entity_type, entity_key, app_id FROM inventory "
+                                 "WHERE app_id IS NOT NULL AND entity_type != 'application'")
+                 if app_id not in app_ids]
+        counts = {}
+        for entity_type, entity_key in stale:
+            self.db.execute('DELETE FROM inventory WHERE entity_type = ? AND entity_key = ?', (entity_type, entity_key))
+            self.db.execute('DELETE FROM inventory_links WHERE entity_type = ? AND entity_key = ?',
+                            (entity_type, entity_key))
+            counts[entity_type] = counts.get(entity_type, 0) + 1
+        return counts
+
+    def commit(self):
+        self.db.commit()
+
+    def query(self, entity_type, name=None, app_name=None, link_type=None, link_value=None):
+        sql = 'SELECT i.entity_type, i.app_name, i.name, i.data FROM inventory i'
+        where = ['i.entity_type = ?']
+        params = [entity_type]
+        if link_type is not None:
+            sql += ' JOIN inventory_links l ON l.entity_type = i.entity_type AND l.entity_key = i.entity_key'
+            where += ['l.link_type = ?', f'l.link_value {_match(link_value)} ?']
+            params += [link_type, link_value]
+        if name is not None:
+            where.append(f'i.name {_match(name)} ?')
+            params.append(name)
+        if app_name is not None:
+            where.append(f'i.app_name {_match(app_name)} ?')
+            params.append(app_name)
+        sql += ' WHERE ' + ' AND '.join(where) + ' ORDER BY i.app_name, i.name'
+        return [{'type': row[0], 'application': row[1], 'name': row[2], 'data': json.loads(row[3])}
+                for row in self.db.execute(sql, params)]
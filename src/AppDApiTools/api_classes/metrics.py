@@ -2,7 +2,6 @@ import datetime
 import json
 import sys
 
-from cryptography.fernet import Fernet
 import requests
 import logging
 import argparse
@@ -33,6 +32,10 @@ class Metrics(ApiBase):
         class_commands.add_argument('--start', help='Metric get start time 24HR format (YYYY-MM-DD HH:MM:SS)')
         class_commands.add_argument('--end', help='Metric get end time 24HR format (YYYY-MM-DD HH:MM:SS)')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        class_commands.add_argument('--workers', help='Number of applications to call concurrently', type=int, default=4)
+        cls.add_format_arguments(class_commands)
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
 
         return class_commands
 
@@ -88,7 +91,7 @@ class Metrics(ApiBase):
 
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.get(base_url + url, auth=auth, headers=headers)
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'User get api get call returned HTTPError: {err}')
@@ -96,10 +99,7 @@ class Metrics(ApiBase):
 
         self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
         if metric_output:
-            json_obj = json.dumps(metrics)
-            with open(metric_output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {metric_output}')
-                outfile.write(json_obj)
+            self.write_output(metrics, metric_output)
         return metrics
 
     def _get_epoch(self, date_time_obj):
@@ -112,40 +112,17 @@ class Metrics(ApiBase):
         if self.args.application is None and app_data is None:
             print('No application id or name specified with --application, see --help')
             sys.exit()
-        app_data = self._get_app_data()
+        if app_data is None:
+            app_data = self._get_app_data()
         base_url = self.config[self.CONTROLLER_SECTION]['base_url']
         headers, auth = self.set_auth_headers()
-        metric_data = []
-        for app in app_data:
-            url = f'controller/rest/applications/{app["id"]}/metrics?output=JSON'
 
-            try:
-                # response = requests.get(url, headers=headers)
-                response = requests.get(base_url + url, auth=auth, headers=headers)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                raise SystemExit(f'Metric Heirarchy api get call returned HTTPError: {err}')
-            app['metric_hierarchy'] = response.json()
-            metric_data.append(app)
-            self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
-        if self.args.output:
-            json_obj = json.dumps(metric_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
-        return metric_data
+        def get_app_tree(app):
+            url = f'controller/rest/applications/{app["id"]}/metrics?output=JSON'
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            app = dict(app, metric_hierarchy=response.json())
+            self.do_verbose_print(json.dumps(app['metric_hierarchy'])[0:200] + '...')
+            return app
 
-    def _get_app_data(self):
-        newargs = argparse.Namespace(subparser_name='Applications',
-                                     function='get',
-                                     id=None,
-                                     name=None,
-                                     verbose=self.args.verbose,
-                                     auth=self.args.auth,
-                                     output=None,
-                                     system=self.args.system)
-        app = Applications(self.config, newargs)
-        app.set_config_prefixes()
-        app.set_app_arg(self.args.application)
-        app_data = app.get_app()
-        return app_data
+        return self.fan_out_output(get_app_tree, app_data, 'Metric Heirarchy')
@@ -0,0 +1,132 @@
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+
+# path segments that are identifiers, collapsed so calls group by endpoint not by app/rule
+ID_SEGMENT = re.compile(r'^\d+$')
+NAMED_PARENTS = {'applications', 'schema', 'publish', 'name', 'schedule'}
+
+
+def endpoint_template(method, url):
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    segments = path.split('/')[1:]
+    template = []
+    for i, segment in enumerate(segments):
+        if ID_SEGMENT.match(segment):
+            template.append('{id}')
+        elif i > 0 and segments[i - 1] in NAMED_PARENTS and segment:
+            template.append('{name}')
+        else:
+            template.append(segment)
+    return f'{method.upper()} /' + '/'.join(template)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class RequestProfiler:
+    """Process wide per request records for --profile, off unless enabled."""
+    enabled = False
+    records = []
+    started = None
+    lock = threading.Lock()
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+        cls.records = []
+        cls.started = time.perf_counter()
+
+    @classmethod
+    def profile(cls, method, url, call):
+        # call returns (response, retries, cached) from the ApiBase request path
+        start = time.perf_counter()
+        record = {'endpoint': endpoint_template(method, url), 'url': url, 'status': None,
+                  'start_ms': (start - cls.started) * 1000, 'latency_ms': 0.0, 'bytes': 0, 'retries': 0,
+                  'cached': False, 'json_ms': 0.0, 'thread': threading.get_ident()}
+        try:
+            response, record['retries'], record['cached'] = call()
+        finally:
+            record['latency_ms'] = (time.perf_counter() - start) * 1000
+            with cls.lock:
+                cls.records.append(record)
+        record['status'] = response.status_code
+        record['bytes'] = len(response.content or b'')
+        decode_json = response.json
+
+        def timed_json(**kwargs):
+            json_start = time.perf_counter()
+            try:
+                return decode_json(**kwargs)
+            finally:
+                record['json_ms'] += (time.perf_counter() - json_start) * 1000
+
+        response.json = timed_json
+        return response
+
+    @classmethod
+    def network_ms(cls):
+        # wall time with at least one call in flight, concurrent calls overlap
+        busy = 0.0
+        current_start = current_end = None
+        for record in sorted(cls.records, key=lambda r: r['start_ms']):
+            end = record['start_ms'] + record['latency_ms']
+            if current_end is None or record['start_ms'] > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = record['start_ms'], end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            busy += current_end - current_start
+        return busy
+
+    @classmethod
+    def summary(cls):
+        wall_ms = (time.perf_counter() - cls.started) * 1000
+        by_endpoint = {}
+        for record in cls.records:
+            by_endpoint.setdefault(record['endpoint'], []).append(record)
+        lines = [f'{"endpoint":<70} {"calls":>6} {"p50 ms":>8} {"p95 ms":>8} {"total ms":>9} {"KB":>8} '
+                 f'{"retries":>7} {"cached":>6} {"json ms":>8}']
+        for endpoint, records in sorted(by_endpoint.items(), key=lambda e: -sum(r['latency_ms'] for r in e[1])):
+            latencies = [r['latency_ms'] for r in records]
+            lines.append(f'{endpoint[:70]:<70} {len(records):>6} {percentile(latencies, 50):>8.1f} '
+                         f'{percentile(latencies, 95):>8.1f} {sum(latencies):>9.1f} '
+                         f'{sum(r["bytes"] for r in records) / 1024:>8.1f} {sum(r["retries"] for r in records):>7} '
+                         f'{sum(1 for r in records if r["cached"]):>6} {sum(r["json_ms"] for r in records):>8.1f}')
+        total_latency = sum(r['latency_ms'] for r in cls.records)
+        lines.append(f'{len(cls.records)} requests, wall {wall_ms:.1f} ms, network busy {cls.network_ms():.1f} ms, '
+                     f'summed request time {total_latency:.1f} ms')
+        return '\n'.join(lines)
+
+    @classmethod
+    def write_records(cls, path):
+        # .jsonl gets one record per line, anything else a chrome://tracing / perfetto trace
+        with open(path, 'w') as outfile:
+            if path.endswith('.jsonl'):
+                for record in cls.records:
+                    outfile.write(json.dumps(record) + '\n')
+                return
+            events = [{'name': r['endpoint'], 'cat': 'http', 'ph': 'X', 'ts': r['start_ms'] * 1000,
+                       'dur': r['latency_ms'] * 1000, 'pid': os.getpid(), 'tid': r['thread'],
+                       'args': {k: r[k] for k in ('url', 'status', 'bytes', 'retries', 'cached', 'json_ms')}}
+                      for r in cls.records]
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, outfile)
+
+    @classmethod
+    def report(cls, args):
+        if not cls.enabled:
+            return
+        if getattr(args, 'profile', False):
+            sys.stderr.write(cls.summary() + '\n')
+        if getattr(args, 'profile_output', None):
+            cls.write_records(args.profile_output)
+            sys.stderr.write(f'Wrote {len(cls.records)} request records to {args.profile_output}\n')
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+RESPONSE_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                                   'response_cache.db')
+
+
+class CachedResponse:
+
+    def __init__(self, row):
+        self.url, self.status, self.headers, self.body, self.etag, self.last_modified, self.stored = row
+
+    def is_fresh(self, ttl):
+        return self.stored + ttl > time.time()
+
+    def to_response(self):
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = 'OK'
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(json.loads(self.headers))
+        response._content = self.body
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+
+class ResponseCache:
+    """Size bounded LRU store of GET responses in sqlite, shared by every thread.
+
+    Bodies are stored as the controller sent them, unencrypted, see the cache notes in sample-config.ini.
+    Once open, a locked or broken file only costs cache misses, it never fails the call.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_FILE, max_bytes=50 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS responses (
+                            cache_key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, body BLOB,
+                            etag TEXT, last_modified TEXT, stored REAL, accessed REAL, size INTEGER)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.db.commit()
+
+    @staticmethod
+    def make_key(section, url, scope):
+        return hashlib.sha256(f'{section}|{scope}|{url}'.encode('UTF-8')).hexdigest()
+
+    def get(self, cache_key):
+        with self.lock:
+            try:
+                row = self.db.execute('SELECT url, status, headers, body, etag, last_modified, stored FROM responses '
+                                      'WHERE cache_key = ?', (cache_key,)).fetchone()
+                if row is None:
+                    return None
+                self.db.execute('UPDATE responses SET accessed = ? WHERE cache_key = ?', (time.time(), cache_key))
+                self.db.commit()
+            except sqlite3.Error:
+                return None
+        return CachedResponse(row)
+
+    def touch(self, cache_key):
+        # a 304 revalidation restarts the ttl without rewriting the body
+        with self.lock:
+            now = time.time()
+            try:
+                self.db.execute('UPDATE responses SET stored = ?, accessed = ? WHERE cache_key = ?',
+                                (now, now, cache_key))
+                self.db.commit()
+            except sqlite3.Error:
+                pass
+
+    def put(self, cache_key, response):
+        body = response.content
+        now = time.time()
+        with self.lock:
+            try:
+                self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (cache_key, response.url, response.status_code, json.dumps(dict(response.headers)),
+                                 body, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                                 now, now, len(body)))
+                self._evict()
+                self.db.commit()
+            except sqlite3.Error:
+                self.db.rollback()
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for cache_key, size in self.db.execute('SELECT cache_key, size FROM responses ORDER BY accessed').fetchall():
+            self.db.execute('DELETE FROM responses WHERE cache_key = ?', (cache_key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
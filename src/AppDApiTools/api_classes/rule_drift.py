@@ -0,0 +1,87 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+RULE_DRIFT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                               'rule_drift.db')
+# seconds a stored rule hash is trusted while the rule summary is unchanged, cache_ttl_rule_drift in config.ini
+RULE_DRIFT_TTL = 3600
+
+
+def summary_hash(summary):
+    return hashlib.sha256(json.dumps(summary, sort_keys=True, separators=(',', ':')).encode('UTF-8')).hexdigest()
+
+
+class RuleHashStore:
+    """Normalized hash of a health rule per app from the last drift run, so reruns only fetch what changed."""
+
+    def __init__(self, path=RULE_DRIFT_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS rule_hashes (
+                            rule_name TEXT, app_id INTEGER, rule_id INTEGER, summary_hash TEXT, rule_hash TEXT,
+                            rule TEXT, checked REAL, PRIMARY KEY (rule_name, app_id)) WITHOUT ROWID''')
+        self.db.commit()
+
+    def load(self, rule_name):
+        # {app id: row dict} of every app checked for this rule before
+        return {row[0]: {'rule_id': row[1], 'summary_hash': row[2], 'rule_hash': row[3], 'rule': json.loads(row[4]),
+                         'checked': row[5]}
+                for row in self.db.execute('SELECT app_id, rule_id, summary_hash, rule_hash, rule, checked '
+                                           'FROM rule_hashes WHERE rule_name = ?', (rule_name,))}
+
+    def put(self, rule_name, app_id, rule_id, summary_digest, rule_hash, rule):
+        self.db.execute('INSERT OR REPLACE INTO rule_hashes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (rule_name, app_id, rule_id, summary_digest, rule_hash, json.dumps(rule), time.time()))
+
+    def remove(self, rule_name, app_id):
+        self.db.execute('DELETE FROM rule_hashes WHERE rule_name = ? AND app_id = ?', (rule_name, app_id))
+
+    def commit(self):
+        self.db.commit()
+
+
+def diff_fields(old, new, path=''):
+    """Changed fields between two normalized rules as dotted paths, list items by index."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in list(old) + [key for key in new if key not in old]:
+            key_path = f'{path}.{key}' if path else key
+            if key not in new:
+                changes.append({'path': key_path, 'change': 'removed', 'old': old[key]})
+            elif key not in old:
+                changes.append({'path': key_path, 'change': 'added', 'new': new[key]})
+            else:
+                changes.extend(diff_fields(old[key], new[key], key_path))
+        return changes
+    if isinstance(old, list) and isinstance(new, list):
+        changes = []
+        for i in range(max(len(old), len(new))):
+            if i >= len(new):
+                changes.append({'path': f'{path}[{i}]', 'change': 'removed', 'old': old[i]})
+            elif i >= len(old):
+                changes.append({'path': f'{path}[{i}]', 'change': 'added', 'new': new[i]})
+            else:
+                changes.extend(diff_fields(old[i], new[i], f'{path}[{i}]'))
+        return changes
+    if old != new or type(old) is not type(new):
+        return [{'path': path, 'change': 'changed', 'old': old, 'new': new}]
+    return []
+
+
+def group_variants(app_hashes, rules):
+    """Variants of a rule by hash, most common first, each with its field diff against the most common.
+
+    app_hashes is [(app, rule hash)] and rules maps each hash to its normalized rule.
+    """
+    apps_by_hash = collections.defaultdict(list)
+    for app, rule_hash in app_hashes:
+        apps_by_hash[rule_hash].append(app)
+    ordered = sorted(apps_by_hash.items(), key=lambda item: (-len(item[1]), item[0]))
+    variants = []
+    for rule_hash, apps in ordered:
+        variants.append({'hash': rule_hash, 'count': len(apps), 'applications': [app['name'] for app in apps],
+                         'changes': diff_fields(rules[ordered[0][0]], rules[rule_hash])})
+    return variants
@@ -1,7 +1,6 @@
 import json
 import sys
 
-from cryptography.fernet import Fernet
 import requests
 import logging
 import argparse
@@ -26,6 +25,9 @@ class Snapshots(ApiBase):
         class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
         class_commands.add_argument('--name', help='Set the name of the application')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        cls.add_format_arguments(class_commands)
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -58,38 +60,20 @@ class Snapshots(ApiBase):
         self.do_verbose_print(json.dumps(app_element)[0:200] + '...')
         self.args.output = output_reset
         if self.args.output:
-            json_obj = json.dumps(app_element)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving app data to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(app_element)
         return app_element
 
     def get_app_list(self):
         self.do_verbose_print('Doing Applications List...')
         base_url = self.config['CONTROLLER_INFO']['base_url']
-        if self.args.auth == 'user':
-            self.do_verbose_print('Doing export with user auth...')
-            crypt_key = str.encode(self.config['CONTROLLER_INFO']['key'], 'UTF-8')
-            fcrypt = Fernet(crypt_key)
-            passwd = fcrypt.decrypt(str.encode(self.config['CONTROLLER_INFO']['psw'], 'UTF-8'))
-            auth = (self.config['CONTROLLER_INFO']['user'] + '@' + self.config['CONTROLLER_INFO']['account_name'],
-                    passwd)
-            headers = None
-        else:
-            self.do_verbose_print('Doing export with token auth...')
-            token = self.get_oauth_token()
-            headers = {"Authorization": "Bearer " + token}
-            auth = None
+        headers, auth = self.set_auth_headers()
         try:
-            response = requests.get(base_url+'controller/rest/applications?output=JSON', headers=headers, auth=auth)
+            response = self.do_request('GET', base_url+'controller/rest/applications?output=JSON', headers=headers, auth=auth)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Dashboard api export call returned HTTPError: {err}')
         app_data = response.json()
         self.do_verbose_print(json.dumps(app_data)[0:200]+'...')
         if self.args.output:
-            json_obj = json.dumps(app_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(app_data)
         return app_data
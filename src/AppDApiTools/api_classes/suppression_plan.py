@@ -0,0 +1,128 @@
+import csv
+import datetime
+import json
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+# plan columns, application, name and timezone are required and ONE_TIME windows also need start and duration
+PLAN_FIELDS = ['application', 'name', 'start', 'duration', 'timezone', 'rule_list', 'tiers', 'recurring_schedule']
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def load_plan(path):
+    # a csv with PLAN_FIELDS columns or a json list of objects with the same keys
+    with open(path, 'r', newline='') as infile:
+        if path.lower().endswith('.csv'):
+            return [{key: value for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(infile)]
+        plan = json.load(infile)
+    if not isinstance(plan, list):
+        raise ValueError(f'{path} must hold a list of suppressions')
+    return plan
+
+
+def _split(value):
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+
+def _zone(timezone):
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(timezone)
+    except Exception:
+        raise ValueError(f'unknown timezone {timezone}')
+
+
+def build_suppression(row, default_timezone=None):
+    """Action suppression json for one plan row, raises ValueError naming what is wrong with it."""
+    unknown = [key for key in row if key not in PLAN_FIELDS]
+    if unknown:
+        raise ValueError(f'unknown fields {", ".join(unknown)}')
+    for key in ('application', 'name'):
+        if not row.get(key):
+            raise ValueError(f'{key} is required')
+    timezone = row.get('timezone') or default_timezone
+    if not timezone:
+        raise ValueError('timezone is required, in the plan or with --timezone')
+    _zone(timezone)
+    suppression = {
+        'name': row['name'],
+        'disableAgentReporting': False,
+        'timezone': timezone,
+        'affects': {'affectedInfoType': 'APPLICATION'},
+        'healthRuleScope': {'healthRuleScopeType': 'ALL_HEALTH_RULES'},
+    }
+    recurring = row.get('recurring_schedule')
+    if recurring:
+        if isinstance(recurring, str):
+            try:
+                recurring = json.loads(recurring)
+            except json.JSONDecodeError as err:
+                raise ValueError(f'recurring_schedule is not json: {err}')
+        if not isinstance(recurring, dict):
+            raise ValueError('recurring_schedule must be a json object')
+        suppression['suppressionScheduleType'] = 'RECURRING'
+        suppression['recurringSchedule'] = recurring
+    else:
+        if not row.get('start') or not row.get('duration'):
+            raise ValueError('start and duration are required for a one time window')
+        try:
+            start = datetime.datetime.strptime(str(row['start']), '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise ValueError(f'start {row["start"]} is not YYYY-MM-DD HH:MM:SS')
+        try:
+            duration = int(row['duration'])
+        except ValueError:
+            raise ValueError(f'duration {row["duration"]} is not a number of minutes')
+        if duration <= 0:
+            raise ValueError('duration must be positive')
+        suppression['suppressionScheduleType'] = 'ONE_TIME'
+        suppression['recurringSchedule'] = None
+        suppression['startTime'] = start.strftime(TIME_FORMAT)
+        suppression['endTime'] = (start + datetime.timedelta(minutes=duration)).strftime(TIME_FORMAT)
+    if row.get('tiers'):
+        suppression['affects'] = {'affectedInfoType': 'TIER_NODE', 'tierOrNode': 'TIER_AFFECTED_ENTITIES',
+                                  'typeofEntitySelection': 'SPECIFIC_TIERS', 'affectedEntities': _split(row['tiers'])}
+    if row.get('rule_list'):
+        suppression['healthRuleScope'] = {'healthRuleScopeType': 'SPECIFIC_HEALTH_RULES',
+                                          'healthRules': _split(row['rule_list'])}
+    return suppression
+
+
+def _local_now(suppression):
+    # suppression times are local to its timezone, an unknown one falls back to this host's time
+    try:
+        zone = _zone(suppression.get('timezone') or 'UTC')
+    except ValueError:
+        zone = None
+    return datetime.datetime.now(zone).replace(tzinfo=None)
+
+
+def _parse_time(value):
+    return datetime.datetime.strptime(value[:19], TIME_FORMAT)
+
+
+def is_expired(suppression, now=None):
+    # only one time windows end
+    if suppression.get('suppressionScheduleType') != 'ONE_TIME' or not suppression.get('endTime'):
+        return False
+    if now is None:
+        now = _local_now(suppression)
+    return _parse_time(suppression['endTime']) < now
+
+
+def is_active(suppression, now=None):
+    # recurring windows are always reported, their schedule is not evaluated
+    if suppression.get('suppressionScheduleType', 'ONE_TIME') != 'ONE_TIME':
+        return True
+    if now is None:
+        now = _local_now(suppression)
+    if suppression.get('startTime') and _parse_time(suppression['startTime']) > now:
+        return False
+    return not suppression.get('endTime') or _parse_time(suppression['endTime']) >= now
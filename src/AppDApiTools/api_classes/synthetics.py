@@ -25,6 +25,8 @@ class Synthetics(ApiBase):
         class_commands.add_argument('--verbose', help='Enable verbose output', action='store_true')
         class_commands.add_argument('--output', help='The output file.')
         class_commands.add_argument('--system', help='Specific system prefix config to use')
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
 
@@ -52,19 +54,19 @@ class Synthetics(ApiBase):
     # def __init__(self, config, args):
     #     super().__init__(config, args)
 
-    def api_get_list(self) -> dict:
+    def api_get_list(self, refresh=False) -> dict:
         self.set_request_logging()
         self.do_verbose_print('Initiating api synthetic get list call...')
         if self.config is None:
             return {}
         #headers = {"Authorization": "Basic "+token}
-        response = requests.get(self.config['SYNTH_INFO']['synthetic_base_url']+'v1/synthetic/api/schedule', auth=(self.config['SYNTH_INFO']['eum_account_name'], self.config['SYNTH_INFO']['eum_license_key']))
+        response = self.do_request('GET', self.config['SYNTH_INFO']['synthetic_base_url']+'v1/synthetic/api/schedule', auth=(self.config['SYNTH_INFO']['eum_account_name'], self.config['SYNTH_INFO']['eum_license_key']), section=self.SYNTH_SECTION, refresh=refresh)
         self.do_verbose_print(response.json())
         self._dump_output(response.json())
 
         return response.json()
 
-    def web_get_list(self, out_file=None) -> dict:
+    def web_get_list(self, out_file=None, refresh=False) -> dict:
         self.set_request_logging()
         self.do_verbose_print('Initiating web synthetic get list call...')
         if self.config is None:
@@ -72,7 +74,7 @@ class Synthetics(ApiBase):
             return {}
         url = self.config[self.SYNTH_SECTION]['synthetic_base_url']+'v1/synthetic/schedule'
         auth = (self.config[self.SYNTH_SECTION]['eum_account_name'], self.config[self.SYNTH_SECTION]['eum_license_key'])
-        response = requests.get(url, auth=auth)
+        response = self.do_request('GET', url, auth=auth, section=self.SYNTH_SECTION, refresh=refresh)
         self.do_verbose_print(f'web_get_list response: {response.text}')
         self._dump_output(response.json())
         return response.json()
@@ -93,7 +95,7 @@ class Synthetics(ApiBase):
         url = self.config[self.SYNTH_SECTION]['synthetic_base_url']+'v1/synthetic/schedule/'+jid
         auth = (self.config[self.SYNTH_SECTION]['eum_account_name'], self.config['SYNTH_INFO']['eum_license_key'])
         headers = {'Content-type': 'application/json'}
-        response = requests.put(url, auth=auth, data=job_data, headers=headers)
+        response = self.do_request('PUT', url, auth=auth, data=job_data, headers=headers, section=self.SYNTH_SECTION)
         self.do_verbose_print(response)
         self.do_verbose_print(response.text)
 
@@ -106,7 +108,8 @@ class Synthetics(ApiBase):
         self._enable_disable_web(True)
 
     def _enable_disable_web(self, enabled):
-        web_list = self.web_get_list()
+        # always update from the current job definitions, never a cached list
+        web_list = self.web_get_list(refresh=True)
         for item in web_list['_items']:
             for k, v in item.items():
                 if self.args.name:
@@ -129,7 +132,7 @@ class Synthetics(ApiBase):
         url = self.config[self.SYNTH_SECTION]['synthetic_base_url'] + 'v1/synthetic/api/schedule/' + jid
         auth = (self.config[self.SYNTH_SECTION]['eum_account_name'], self.config['SYNTH_INFO']['eum_license_key'])
         headers = {'Content-type': 'application/json'}
-        response = requests.put(url, auth=auth, data=job_data, headers=headers)
+        response = self.do_request('PUT', url, auth=auth, data=job_data, headers=headers, section=self.SYNTH_SECTION)
         self.do_verbose_print(response)
         self.do_verbose_print(response.text)
 
@@ -142,7 +145,8 @@ class Synthetics(ApiBase):
         self._enable_disable_api(True)
 
     def _enable_disable_api(self, enabled):
-        api_list = self.api_get_list()
+        # always update from the current job definitions, never a cached list
+        api_list = self.api_get_list(refresh=True)
         for item in api_list['_items']:
             for k, v in item.items():
                 if self.args.name:
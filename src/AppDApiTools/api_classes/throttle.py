@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# statuses the controller uses to tell us to slow down
+THROTTLE_STATUS = (429, 503)
+# a 503 (maybe from a proxy) does not prove a write was not done, so other methods only retry a 429
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+# longest wait for one retry, a larger Retry-After would stall every caller of the system
+MAX_RETRY_DELAY = 60.0
+
+
+def is_retryable(method, status):
+    if status == 429:
+        return True
+    return status in THROTTLE_STATUS and method.upper() in IDEMPOTENT_METHODS
+
+
+class TokenBucket:
+    """Client side requests per second limit, a rate of 0 disables it."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # a Retry-After holds back every caller of this system, not just the throttled one
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit, halves on throttling and creeps back up by one per window of successes."""
+
+    def __init__(self, max_limit, min_limit=1, decrease_interval=1.0):
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.decrease_interval = decrease_interval
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                # a burst of 429s from one window only counts as a single decrease
+                if now - self.last_decrease >= self.decrease_interval:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class Throttle:
+    """Rate limit, adaptive concurrency and throttled retry policy for one system."""
+
+    def __init__(self, rate=0, burst=None, max_concurrency=10, retries=5, backoff=1.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+
+    def acquire(self):
+        self.bucket.acquire()
+        self.limiter.acquire()
+
+    def release(self, throttled=False):
+        self.limiter.release(throttled)
+
+    def retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return min(MAX_RETRY_DELAY, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+            try:
+                return min(MAX_RETRY_DELAY,
+                           max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+        # exponential backoff with jitter when the controller gives no hint
+        return min(MAX_RETRY_DELAY, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def pause(self, seconds):
+        self.bucket.pause(seconds)
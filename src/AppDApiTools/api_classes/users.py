@@ -2,7 +2,6 @@ import datetime
 import json
 import sys
 
-from cryptography.fernet import Fernet
 import requests
 import logging
 import argparse
@@ -31,6 +30,10 @@ class Users(ApiBase):
         class_commands.add_argument('--name', help='Health Rule name or Suppression name')
         class_commands.add_argument('--id', help='Health Rule id or Suppression id')
         class_commands.add_argument('--auth', help='The auth scheme.', choices=['key', 'user'], default='key')
+        class_commands.add_argument('--workers', help='Number of users and roles to get concurrently', type=int, default=4)
+        cls.add_format_arguments(class_commands)
+        cls.add_cache_arguments(class_commands)
+        cls.add_profile_arguments(class_commands)
         return class_commands
 
     @classmethod
@@ -71,16 +74,13 @@ class Users(ApiBase):
             # id will take precedence over name if both given
             url = f'controller/api/rbac/v1/roles/{role_id}?include-permissions=true'
         try:
-            response = requests.get(base_url + url, auth=auth, headers=headers)
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'Health Rule api export call returned HTTPError: {err}')
         role_data = response.json()
         if role_output:
-            json_obj = json.dumps(role_data)
-            with open(role_output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {role_output}')
-                outfile.write(json_obj)
+            self.write_output(role_data, role_output)
         return role_data
 
     def _get_role_ids(self, user_data):
@@ -96,25 +96,50 @@ class Users(ApiBase):
         self.set_request_logging()
         self.do_verbose_print('Doing Users list (all data)...')
         out_tmp = self.args.output
-        list = self.list()
-        self.args.output = out_tmp
+        self.args.output = None
+        user_list = self.list()
         all_data = {
             'users': [],
             'roles': []
         }
+        stream = None
+        if out_tmp and self.is_ndjson():
+            # with ndjson each user and role is written as a {"user": ...} or {"role": ...} line when fetched
+            stream = open(out_tmp, "w", buffering=1)
+        base_url = self.config[self.CONTROLLER_SECTION]['base_url']
+        headers, auth = self.set_auth_headers()
+
+        def fetch(url):
+            # unlike get and get_role a failed call raises, so iter_fan_out records it and carries on
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
+            response.raise_for_status()
+            return response.json()
+
+        errors = []
         role_id_set = set()
-        for user in list["users"]:
-            user = self.get(user_id=user["id"])
-            all_data['users'].append(user)
-            role_id_set.update(self._get_role_ids(user_data=user))
-        for role_id in role_id_set:
-            role = self.get_role(output=None, id=role_id)
-            all_data['roles'].append(role)
-        if self.args.output:
-            json_obj = json.dumps(all_data)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
+        user_ids = [user["id"] for user in user_list["users"]]
+        try:
+            for user_id, user in self.iter_fan_out(
+                    lambda uid: fetch(f'controller/api/rbac/v1/users/{uid}?output=JSON'), user_ids, errors):
+                role_id_set.update(self._get_role_ids(user_data=user))
+                if stream:
+                    stream.write(json.dumps({'user': user}) + '\n')
+                else:
+                    all_data['users'].append(user)
+            role_ids = sorted(role_id_set)
+            for role_id, role in self.iter_fan_out(
+                    lambda rid: fetch(f'controller/api/rbac/v1/roles/{rid}?include-permissions=true'), role_ids, errors):
+                if stream:
+                    stream.write(json.dumps({'role': role}) + '\n')
+                else:
+                    all_data['roles'].append(role)
+        finally:
+            if stream:
+                stream.close()
+        self.args.output = out_tmp
+        self.report_fan_out_errors(errors, len(user_ids) + len(role_id_set), 'User and Role get')
+        if self.args.output and not stream:
+            self.write_output(all_data)
         return all_data
 
     def list(self):
@@ -130,7 +155,7 @@ class Users(ApiBase):
 
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.get(base_url + url, auth=auth, headers=headers)
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'User list api get call returned HTTPError: {err}')
@@ -138,10 +163,7 @@ class Users(ApiBase):
 
         self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
         if self.args.output:
-            json_obj = json.dumps(users)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(users)
         return users
 
     def get(self, user_id=None):
@@ -160,7 +182,7 @@ class Users(ApiBase):
 
         try:
             # response = requests.get(url, headers=headers)
-            response = requests.get(base_url + url, auth=auth, headers=headers)
+            response = self.do_request('GET', base_url + url, auth=auth, headers=headers)
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise SystemExit(f'User get api get call returned HTTPError: {err}')
@@ -168,9 +190,6 @@ class Users(ApiBase):
 
         self.do_verbose_print(json.dumps(response.json())[0:200] + '...')
         if self.args.output:
-            json_obj = json.dumps(users)
-            with open(self.args.output, "w") as outfile:
-                self.do_verbose_print(f'Saving exported file to {self.args.output}')
-                outfile.write(json_obj)
+            self.write_output(users)
         return users
 
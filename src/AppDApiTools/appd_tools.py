@@ -1,18 +1,29 @@
 import argparse
 import configparser
 import importlib
-import pkgutil
 import sys
 import os
-from cryptography.fernet import Fernet
 from getpass import getpass
-import AppDApiTools
-from AppDApiTools import api_classes
-from AppDApiTools.api_classes import api_base
+
+# static command manifest so only the selected api class module (and requests, crypto etc. it needs) is imported
+# keep in sync with the ApiBase subclasses in api_classes, name: (module, help)
+COMMANDS = {
+    'Applications': ('applications', 'Applications commands'),
+    'Backends': ('backends', 'Backends commands'),
+    'Dashboards': ('dashboards', 'Dashboards commands'),
+    'Events': ('events', 'Events commands'),
+    'Healthrules': ('healthrules', 'Healthrules commands'),
+    'Inventory': ('inventory', 'Inventory commands'),
+    'Metrics': ('metrics', 'Metrics commands'),
+    'Snapshots': ('snapshots', 'Snapshots commands'),
+    'Synthetics': ('synthetics', 'Synthetics commands'),
+    'Users': ('users', 'User commands'),
+}
 
 
 def build_config(args=None):
     #print("in build config")
+    from cryptography.fernet import Fernet
     new_config = configparser.ConfigParser(allow_no_value=True)
     #print(os.path.join(os.path.dirname(__file__), 'config', 'sample-config.ini'))
 
@@ -61,25 +72,36 @@ def build_config(args=None):
     sys.exit()
 
 
-def do_work():
+def get_api_class(name):
+    module, help_text = COMMANDS[name]
+    return getattr(importlib.import_module('AppDApiTools.api_classes.' + module), name)
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(__file__), 'config', 'config.ini'))
+    if not config.sections():
+        # run config setup
+        build_config()
+    return config
+
+
+def do_work(argv=None):
     # Use a breakpoint in the code line below to debug your script.
     parser = argparse.ArgumentParser(description='AppDynamics API Tooling.')
     parser.add_argument("--config", help="create or update config", action="store_true")
     parser.add_argument("--add_section", help="add a new controller config to existing", action="store_true")
-    package = api_classes
-    for (module_loader, name, ispkg) in pkgutil.iter_modules(package.__path__):
-        importlib.import_module('.' + name, 'AppDApiTools.api_classes')
-
-    all_my_base_classes = {cls.__name__: cls for cls in api_base.ApiBase.__subclasses__()}
-    #print(all_my_base_classes)
+    argv = sys.argv[1:] if argv is None else argv
+    # only the command being run gets its real argument parser, the rest are listed for -h
+    selected = next((arg for arg in argv if arg in COMMANDS), None)
     sub_parser = parser.add_subparsers(dest='subparser_name', help='sub commands help')
-    for k, v in all_my_base_classes.items():
-        mods = importlib.import_module('AppDApiTools.api_classes.' + k.lower())
-        #print(mods)
-        c = getattr(mods, k)
-        c.get_function_parms(sub_parser)
+    for name, (module, help_text) in COMMANDS.items():
+        if name == selected:
+            get_api_class(name).get_function_parms(sub_parser)
+        else:
+            sub_parser.add_parser(name, help=help_text)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if args.config:
         build_config(args)
         sys.exit()
@@ -87,16 +109,21 @@ def do_work():
         sys.stderr.write('No Api Group Specified!')
         parser.print_help()
         sys.exit(2)
-    api_class_ref = getattr(importlib.import_module('AppDApiTools.api_classes.' + args.subparser_name.lower()), args.subparser_name)
+    api_class_ref = get_api_class(args.subparser_name)
     #print(args.subparser_name)
-    api_class_ref.run(args, config)
-
-
-config = configparser.ConfigParser()
-config.read(os.path.join(os.path.dirname(__file__), 'config', 'config.ini'))
-if not config.sections():
-    # run config setup
-    build_config()
+    if not (args.profile or args.profile_output):
+        api_class_ref.run(args, load_config())
+    else:
+        from AppDApiTools.api_classes.profiler import RequestProfiler
+        RequestProfiler.enable()
+        try:
+            api_class_ref.run(args, load_config())
+        finally:
+            RequestProfiler.report(args)
+    # partial failures were reported on stderr, scripts see them in the exit status
+    from AppDApiTools.api_classes.api_base import ApiBase
+    if ApiBase.failed_items:
+        sys.exit(1)
 
 
 